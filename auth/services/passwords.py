@@ -0,0 +1,148 @@
+import os
+import time
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+# FastAPI
+from fastapi.exceptions import HTTPException
+
+# Cryptography
+from passlib.context import CryptContext
+
+# Env
+from decouple import config
+
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", cast=int, default=12)
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
+
+
+class PasswordPool:
+    """Thread pool for bcrypt, kept off the event loop
+
+    bcrypt releases the GIL, so hashes run in parallel in threads. At most
+    ``queue_size`` hashes may be running or waiting, more are rejected with
+    429, and a hash not done after ``timeout`` seconds answers 503.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float) -> None:
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="passwords")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.max_hash_seconds = 0.0
+
+    @staticmethod
+    def _timed(submitted: float, func: Callable, *args) -> tuple[Any, float, float]:
+        started = time.perf_counter()
+        result = func(*args)
+        return result, started - submitted, time.perf_counter() - started
+
+    def _done(self, future: Future) -> None:
+        self.pending -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, waited, elapsed = future.result()
+        self.completed += 1
+        self.wait_seconds += waited
+        self.hash_seconds += elapsed
+        self.max_hash_seconds = max(self.max_hash_seconds, elapsed)
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run a password function in the pool
+
+        Args:
+            func (Callable): pwd_context.hash or pwd_context.verify
+            args (Any): arguments of the function
+
+        Raises:
+            HTTPException: 429 if the queue is full, 503 on timeout
+
+        Returns:
+            Any: result of the function
+        """
+        if self.pending >= self.queue_size:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, try again later",
+                headers={"Retry-After": "1"},
+            )
+
+        # the slot is given back when the hash ends, even after a timeout
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future = self.executor.submit(self._timed, time.perf_counter(), func, *args)
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._done, f))
+        try:
+            result, _, _ = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), self.timeout
+            )
+            return result
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Service busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+
+    def stats(self) -> dict[str, float]:
+        """Queue depth, counters and latencies of the pool"""
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "depth": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.wait_seconds / completed * 1000, 2),
+            "avg_hash_ms": round(self.hash_seconds / completed * 1000, 2),
+            "max_hash_ms": round(self.max_hash_seconds * 1000, 2),
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+password_pool = PasswordPool(
+    workers=config("PASSWORD_WORKERS", cast=int, default=os.cpu_count() or 2),
+    queue_size=config("PASSWORD_QUEUE_SIZE", cast=int, default=64),
+    timeout=config("PASSWORD_TIMEOUT", cast=float, default=5),
+)
+
+
+async def hash_password(password: str) -> str:
+    """hash a password in the password pool
+
+    Args:
+        password (str): plain password
+
+    Returns:
+        str: hashed password
+    """
+    return await password_pool.run(pwd_context.hash, password)
+
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    """check a password against its hash in the password pool
+
+    Args:
+        plain_password (str): plain password
+        hashed_password (str): hashed password
+
+    Returns:
+        bool: True if the password matches
+    """
+    return await password_pool.run(
+        pwd_context.verify, plain_password, hashed_password
+    )
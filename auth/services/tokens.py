@@ -0,0 +1,157 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+# JWT
+from jose import JWTError, jwt
+
+# FastAPI
+from fastapi import Request
+from fastapi.exceptions import HTTPException
+
+# db
+from imagine.db_manager import adb, AsyncRedisManager
+
+# Env
+from decouple import config
+
+SECRET_KEY = config("SECRET_KEY")
+ALGORITHM = config("ALGORITHM", default="HS256")
+
+TOKEN_CACHE_SIZE = config("AUTH_TOKEN_CACHE_SIZE", cast=int, default=1024)
+# tokens without exp are verified again after this many seconds
+TOKEN_CACHE_TTL = config("AUTH_TOKEN_CACHE_TTL", cast=float, default=300)
+
+
+class ClaimsCache:
+    """Bounded LRU of verified tokens and their claims
+
+    An entry never outlives the ``exp`` claim of its token, so an expired
+    token is decoded again and rejected by jose.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, token: str) -> dict | None:
+        entry = self._data.get(token)
+        if entry is None:
+            return None
+        expires_at, claims = entry
+        if expires_at <= time.time():
+            del self._data[token]
+            return None
+        self._data.move_to_end(token)
+        return claims
+
+    def set(self, token: str, claims: dict) -> None:
+        expires_at = time.time() + self.ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = min(expires_at, claims["exp"])
+        self._data[token] = (expires_at, claims)
+        self._data.move_to_end(token)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+
+claims_cache = ClaimsCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+
+def create_token(data: dict[str, Any]) -> str:
+    """sign the claims of a token
+
+    Args:
+        data (dict[str, Any]): claims
+
+    Returns:
+        str: token
+    """
+    return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_token(token: str) -> dict:
+    """verify a token and return its claims, verified tokens are cached
+
+    Args:
+        token (str): token
+
+    Raises:
+        JWTError: if the token is not valid or expired
+
+    Returns:
+        dict: claims
+    """
+    if (claims := claims_cache.get(token)) is not None:
+        return claims
+
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    claims_cache.set(token, claims)
+    return claims
+
+
+class AuthContext:
+    """Auth of one request, resolved once and kept on request.state.auth
+
+    Both LogsMiddleware and get_current_user read it, so the token is
+    verified and the user data looked up only once per request.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        user_data: dict | None = None,
+        error: HTTPException | None = None,
+    ) -> None:
+        self.token = token
+        self.user_data = user_data
+        self.error = error
+
+
+async def _load_user_data(token: str, cache: AsyncRedisManager) -> dict:
+    try:
+        email = decode_token(token).get("email")
+    except JWTError:
+        email = None
+    if email is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication")
+
+    if (cache_data := await cache.get(f"user_data:{email}")) is not None:
+        return cache_data
+
+    user_data = await adb.execute_sp("imfun_get_user_data", email)
+    await cache.create(f"user_data:{email}", user_data, 5)
+    return user_data
+
+
+async def current_user_data(
+    request: Request, token: str, cache: AsyncRedisManager
+) -> dict:
+    """user data of the bearer token of a request
+
+    Args:
+        request (Request): request
+        token (str): bearer token
+        cache (AsyncRedisManager): cache
+
+    Raises:
+        HTTPException: if the token is not valid
+
+    Returns:
+        dict: user data
+    """
+    auth: AuthContext | None = getattr(request.state, "auth", None)
+    if auth is None or auth.token != token:
+        try:
+            auth = AuthContext(token, user_data=await _load_user_data(token, cache))
+        except HTTPException as e:
+            auth = AuthContext(token, error=e)
+        request.state.auth = auth
+
+    if auth.error is not None:
+        raise auth.error
+    return auth.user_data
@@ -4,26 +4,25 @@ import re
 from datetime import datetime, timedelta
 
 # JWT
-from jose import JWTError, jwt
+from auth.services.tokens import create_token
 
 # FastAPI
 from fastapi import Depends
 from fastapi.exceptions import HTTPException
 from fastapi.security import OAuth2PasswordBearer
 
-# Cryptography
-from passlib.context import CryptContext
+# Passwords
+from auth.services.passwords import check_password, hash_password
 
 # Schemas
 from auth.schemas.auth import AuthUserCreate, AuthUser, UserData, FullUser
 
 # db
-from imagine.db_manager import db
+from imagine.db_manager import adb
 
 # Env
 from decouple import config
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 ACCESS_TOKEN_EXPIRE_MINUTES = config('ACCESS_TOKEN_EXPIRE_MINUTES', cast=int)
 
@@ -33,8 +32,8 @@ def valid_email(email: str) -> bool:
     return re.match(expresion_regular, email) is not None
 
 
-def verify_password(plain_password: str, hashed_password: str) -> None:
-    """verify the password
+async def verify_password(plain_password: str, hashed_password: str) -> None:
+    """verify the password, off the event loop
 
     Args:
         plain_password (str): plain password
@@ -44,7 +43,7 @@ def verify_password(plain_password: str, hashed_password: str) -> None:
         HTTPException: if the password is not correct
     """
 
-    verify = pwd_context.verify(plain_password, hashed_password)
+    verify = await check_password(plain_password, hashed_password)
 
     if not verify:
         raise HTTPException(status_code=400, detail="Incorrect password")
@@ -65,8 +64,7 @@ def create_access_token(
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, config("SECRET_KEY"), algorithm="HS256")
-    return encoded_jwt
+    return create_token(to_encode)
 
 
 def generate_token(user: AuthUser) -> str:
@@ -82,8 +80,8 @@ def generate_token(user: AuthUser) -> str:
     return access_token
 
 
-def get_password_hash(password: str) -> str:
-    """hash the password
+async def get_password_hash(password: str) -> str:
+    """hash the password, off the event loop
 
     Args:
         password (str): plain password
@@ -91,26 +89,28 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: hashed password
     """
-    return pwd_context.hash(password)
+    return await hash_password(password)
 
 
-def create_user(user: AuthUserCreate, group_id: int) -> int:
-    validate_user = db.fetch_one(
-        f"select u.id from users u where u.email = '{user.email}'"
+async def create_user(user: AuthUserCreate, group_id: int) -> int:
+    validate_user = await adb.fetch_one(
+        "select u.id from users u where u.email = $1", user.email
     )
     if validate_user:
         raise HTTPException(
             status_code=400, detail="User with this email already exists."
         )
 
-    password = get_password_hash(user.password)
+    password = await get_password_hash(user.password)
 
-    user_id = db.execute_sp(
-        "imfun_signup_user",
-        f"$${user.name}$$::varchar",
-        f"$${user.email}$$::varchar",
-        f"$${password}$$::varchar",
-        f"{group_id}::int8",
+    user_id = (
+        await adb.execute_sp(
+            "imfun_signup_user",
+            user.name,
+            user.email,
+            password,
+            group_id,
+        )
     )["user_id"]
 
     user = AuthUser(**user.dict(), id=user_id, group_id=group_id)
@@ -118,7 +118,7 @@ def create_user(user: AuthUserCreate, group_id: int) -> int:
     return user_id
 
 
-def authenticate_user(email: str, password: str) -> str:
+async def authenticate_user(email: str, password: str) -> str:
     """authenticate the user on login
 
     Args:
@@ -132,9 +132,9 @@ def authenticate_user(email: str, password: str) -> str:
     if not valid_email(email):
         raise HTTPException(status_code=400, detail="Invalid email")
 
-    user_data = db.execute_sp("imfun_get_user_data", f"'{email}'::varchar")
+    user_data = await adb.execute_sp("imfun_get_user_data", email)
     user_data = FullUser(**user_data)
-    verify_password(password, user_data.password)
+    await verify_password(password, user_data.password)
     token = generate_token(user_data)
     return token
 
@@ -1,28 +1,10 @@
-import os
-from psycopg2 import connect
-from decouple import config
+# Applies db_files/migrations once per deploy, see imagine/migrations.py:
+#   python db_creation.py
+#   python db_creation.py --baseline N   (record up to N without running)
+# A database created by creation.sql (0001 unchanged) is baselined at 0001
+# automatically.
+from imagine.migrations import main
 
 
-def create_db():
-    file = os.path.dirname(__file__) + "db_file/creation.sql"
-
-    conn = connect(
-        host=config("DB_HOST"),
-        dbname=config("DB_NAME"),
-        user=config("DB_USER"),
-        password=config("DB_PASS"),
-        port=config("DB_PORT"),
-    )
-
-    cur = conn.cursor()
-
-    try:
-        with open(file, "r") as f:
-            sql = f.read()
-            cur.execute(sql)
-            conn.commit()
-    except Exception as e:
-        print("file already executed")
-        conn.rollback()
-    cur.close()
-    conn.close()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+-- Regression check for imfun_get_notes and imfun_get_note
+--
+-- Seeds a dataset, checks the results and the cost of listing one page and
+-- rolls everything back. Run it against a migrated database, alone or with
+-- the other checks through run.sh:
+--   psql -v ON_ERROR_STOP=1 -f db_files/checks/imfun_get_notes.sql
+--   sh db_files/checks/run.sh
+-- It fails (exit code 3) on a wrong count or a page over the buffer budget.
+
+begin;
+
+insert into users (id, name, email, password, group_id)
+select
+    ('00000000-0000-0000-0000-' || lpad(i::text, 12, '0'))::uuid,
+    'check user ' || i,
+    'check' || i || '@check.test',
+    'check',
+    2
+from generate_series(1, 50) i;
+
+insert into tags (name)
+select 'check-tag-' || i
+from generate_series(1, 5) i;
+
+insert into notes (title, content, user_id)
+select
+    'check note ' || i,
+    'check content ' || i,
+    '00000000-0000-0000-0000-000000000001'::uuid
+from generate_series(1, 20000) i;
+
+-- every note has the 5 tags, the most recent note is liked by the 50 users
+insert into notes_tags (note_id, tag_id)
+select n.id, t.id
+from notes n
+cross join tags t
+where n.title like 'check note %' and t.name like 'check-tag-%';
+
+-- liked twice, the second round must not change the counters
+select imfun_like_notes(array_agg(l.note_id), array_agg(l.user_id))
+from (
+    select (select max(n.id) from notes n where n.title like 'check note %') note_id, u.id user_id
+    from users u
+    cross join generate_series(1, 2)
+    where u.email like '%@check.test'
+) l;
+
+analyze users;
+analyze tags;
+analyze notes;
+analyze notes_tags;
+analyze notes_likes;
+
+do $$
+declare
+    _note_id bigint := (select max(n.id) from notes n where n.title like 'check note %');
+    _note record;
+    _plan json;
+    _buffers bigint;
+begin
+    -- likes are not multiplied by the number of tags
+    select * into _note from imfun_get_note(_note_id);
+    if _note.total_likes <> 50 then
+        raise exception 'imfun_get_note total_likes is %, expected 50', _note.total_likes;
+    end if;
+    if jsonb_array_length(_note.tags) <> 5 then
+        raise exception 'imfun_get_note returned % tags, expected 5', jsonb_array_length(_note.tags);
+    end if;
+
+    -- filtering by a tag keeps every tag of the note in the result
+    select * into _note
+    from imfun_get_notes(null, 1, 10, null, array['check-tag-1'], null) n
+    where n.id = _note_id;
+    if _note.likes <> 50 then
+        raise exception 'imfun_get_notes likes is %, expected 50', _note.likes;
+    end if;
+    if jsonb_array_length(_note.tags) <> 5 then
+        raise exception 'imfun_get_notes returned % tags, expected 5', jsonb_array_length(_note.tags);
+    end if;
+
+    -- one page only touches the notes of the page, not the whole
+    -- notes x tags x likes join (warm the plan cache first)
+    perform * from imfun_get_notes(null, 1, 10, null, null, null);
+    execute 'explain (analyze, buffers, format json) '
+        'select * from imfun_get_notes(null, 1, 10, null, null, null)'
+        into _plan;
+    _buffers := (_plan -> 0 -> 'Plan' ->> 'Shared Hit Blocks')::bigint
+        + (_plan -> 0 -> 'Plan' ->> 'Shared Read Blocks')::bigint;
+    if _buffers > 500 then
+        raise exception 'imfun_get_notes read % buffers for one page of 10 notes', _buffers;
+    end if;
+
+    raise notice 'imfun_get_notes: ok (% buffers for one page)', _buffers;
+end;
+$$;
+
+rollback;
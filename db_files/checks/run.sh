@@ -0,0 +1,12 @@
+#!/bin/sh
+# Runs every check of db_files/checks against a migrated database and stops
+# at the first failure. Each check rolls back the data it seeds. The
+# connection comes from the usual libpq variables, e.g.
+#   PGHOST=localhost PGUSER=imagine PGDATABASE=imagine sh db_files/checks/run.sh
+set -e
+cd "$(dirname "$0")"
+for check in *.sql; do
+    echo "== $check"
+    psql -X -q -v ON_ERROR_STOP=1 -f "$check"
+done
+echo "all checks passed"
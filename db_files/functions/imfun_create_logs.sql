@@ -0,0 +1,36 @@
+drop function if exists imfun_create_logs;
+
+create or replace function imfun_create_logs(
+    _user_ids uuid[],
+    _requests jsonb[],
+    _responses jsonb[],
+    _users_data jsonb[],
+    _urls varchar[]
+) returns void
+language plpgsql
+as $$
+
+begin
+
+    insert into logs (
+        user_id,
+        request,
+        response,
+        user_data,
+        route_permission_id
+    )
+    select
+        l.user_id,
+        l.request,
+        l.response,
+        l.user_data,
+        (
+            select rp.id
+            from routes_permissions rp
+            where rp.route ilike l.url
+            limit 1
+        )
+    from unnest(_user_ids, _requests, _responses, _users_data, _urls)
+        as l(user_id, request, response, user_data, url);
+end;
+$$;
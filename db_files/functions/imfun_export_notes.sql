@@ -0,0 +1,37 @@
+drop function if exists imfun_export_notes;
+
+-- plain sql so the query is inlined and a cursor over it streams the rows,
+-- a plpgsql function would build the whole result first
+create or replace function imfun_export_notes(
+    _user_id uuid default null
+) returns table (
+    id bigint,
+    title varchar,
+    content text,
+    favorite boolean,
+    user_id uuid,
+    tags varchar[],
+    likes bigint,
+    created_at timestamptz,
+    updated_at timestamptz
+)
+language sql
+stable
+as $$
+    select n.id, n.title, n."content", n.favorite, n.user_id,
+        array(
+            select t.name
+            from notes_tags nt
+            join tags t on t.id = nt.tag_id
+            where nt.note_id = n.id and nt.active = true
+            order by t.name
+        ) tags,
+        n.like_count likes,
+        n.created_at,
+        n.updated_at
+    from notes n
+    where
+        n.active = true
+        and (_user_id is null or n.user_id = _user_id)
+    order by n.id;
+$$;
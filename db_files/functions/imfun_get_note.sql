@@ -22,30 +22,37 @@ begin
             'id', u.id ,
             'name', u."name"
         ) "user",
-        jsonb_agg(
-            distinct
+        coalesce(note_tags.tags, '[]') tags,
+        n.like_count total_likes,
+        coalesce(note_likes.likes, '[]') likes
+    from notes n
+    join users u on u.id = n.user_id
+    left join lateral (
+        select jsonb_agg(
             jsonb_build_object(
                 'id', t.id,
                 'name', t."name"
-            ) 
-        ) tags,
-        count(nl.id) total_likes,
-        jsonb_agg(
-            DISTINCT
+            )
+            order by t.name
+        ) tags
+        from notes_tags nt
+        join tags t on t.id = nt.tag_id
+        where nt.note_id = n.id and nt.active = true
+    ) note_tags on true
+    left join lateral (
+        select jsonb_agg(
             jsonb_build_object(
                 'id', u2.id,
                 'name', u2."name"
             )
+            order by nl.created_at
         ) likes
-    from notes n
-    join users u on u.id = n.user_id
-    left join notes_tags nt on n.id = nt.note_id
-    left join tags t on nt.tag_id = t.id
-    left join notes_likes nl on nl.note_id = n.id
-    left join users u2 on nl.user_id = u2.id
+        from notes_likes nl
+        join users u2 on nl.user_id = u2.id
+        where nl.note_id = n.id
+    ) note_likes on true
     where
         n.active = true
-        and n.id = _id
-    group by n.id, u.id;
+        and n.id = _id;
 end;
 $$;
@@ -0,0 +1,20 @@
+drop function if exists imfun_get_note_version;
+
+-- what the ETag and Last-Modified of a note are derived from, read by
+-- primary key without building the note
+create or replace function imfun_get_note_version(
+    _id bigint
+) returns table (
+    id bigint,
+    modified_at timestamptz,
+    likes bigint
+)
+language sql
+stable
+as $$
+    select n.id, greatest(n.updated_at, n.liked_at), n.like_count
+    from notes n
+    where
+        n.active = true
+        and n.id = _id;
+$$;
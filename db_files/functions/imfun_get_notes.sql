@@ -6,12 +6,16 @@ create or replace function imfun_get_notes(
     _page_size integer,
     _name varchar,
     _tags varchar[],
-    _favorites boolean
+    _favorites boolean,
+    _cursor_updated_at timestamptz default null,
+    _cursor_id bigint default null,
+    _search_mode varchar default 'substring'
 ) returns table (
     id bigint,
     title varchar,
     content text,
     favorite boolean,
+    updated_at timestamptz,
     "user" jsonb,
     tags jsonb,
     likes bigint
@@ -21,57 +25,70 @@ as $$
 
 declare
     _offset integer := (_page - 1) * _page_size;
+    _fulltext boolean := _query is not null and _search_mode = 'fulltext';
+    _tsquery tsquery := case
+        when _fulltext then websearch_to_tsquery('simple', _query)
+    end;
 
 begin
+    -- the page is chosen first, tags are aggregated only for the notes of
+    -- the page
     return query
-    select n.id, n.title, n."content", n.favorite,
+    with page as (
+        select
+            n.id,
+            n.updated_at,
+            case when _fulltext then ts_rank(n.search_vector, _tsquery) end rank
+        from notes n
+        where
+            n.active = true
+            and (_query is null or _fulltext or n.title ilike '%' || _query || '%')
+            and (not _fulltext or n.search_vector @@ _tsquery)
+            and (_name is null or n.title ilike '%' || _name || '%')
+            and (
+                _tags is null
+                or exists (
+                    select 1
+                    from notes_tags nt
+                    join tags t on t.id = nt.tag_id
+                    where
+                        nt.note_id = n.id
+                        and nt.active = true
+                        and t.name = any(_tags)
+                )
+            )
+            and (_favorites is null or n.favorite = _favorites)
+            and (
+                _cursor_id is null
+                or (n.updated_at, n.id) < (_cursor_updated_at, _cursor_id)
+            )
+        order by rank desc nulls last, n.updated_at desc, n.id desc
+        limit _page_size
+        offset case when _cursor_id is null then _offset else 0 end
+    )
+    select n.id, n.title, n."content", n.favorite, n.updated_at,
         jsonb_build_object(
             'id', u.id ,
             'name', u."name"
         ) "user",
-        jsonb_agg(
-            distinct
+        coalesce(note_tags.tags, '[]') tags,
+        n.like_count likes
+    from page p
+    join notes n on n.id = p.id
+    join users u on u.id = n.user_id
+    left join lateral (
+        select jsonb_agg(
             jsonb_build_object(
                 'id', t.id,
                 'name', t."name"
-            ) 
-        ) tags,
-        count(nl.id) likes
-    from notes n 
-    join users u on u.id = n.user_id 
-    left join notes_tags nt on n.id = nt.note_id  
-    left join tags t on nt.tag_id = t.id
-    left join notes_likes nl on nl.note_id = n.id 
-    where
-        n.active = true
-        and case
-            when _query is not null then
-                n.title ilike '%' || _query || '%'
-            else
-                true
-        end
-        and case
-            when _name is not null then
-                n.title ilike '%' || _name || '%'
-            else
-                true
-        end
-        and case
-            when _tags is not null then
-                t.name = any(_tags)
-            else
-                true
-        end
-        and case
-            when _favorites is not null then
-                n.favorite = _favorites
-            else
-                true
-        end
-    group by n.id, u.id
-    order by n.updated_at desc
-    limit _page_size
-    offset _offset;
+            )
+            order by t.name
+        ) tags
+        from notes_tags nt
+        join tags t on t.id = nt.tag_id
+        where nt.note_id = n.id and nt.active = true
+    ) note_tags on true
+    order by p.rank desc nulls last, p.updated_at desc, p.id desc;
 
-end;    
-$$;
\ No newline at end of file
+end;
+$$;
@@ -0,0 +1,32 @@
+drop function if exists imfun_get_permissions;
+
+create or replace function imfun_get_permissions()
+returns table (
+    route varchar,
+    method varchar,
+    exclude boolean,
+    user_group_ids bigint[]
+)
+language plpgsql
+as $$
+
+begin
+
+    return query
+    select
+        rp.route,
+        rp.method,
+        rp."exclude",
+        coalesce(
+            array_agg(ugp.user_group_id) filter (where ugp.id is not null),
+            '{}'
+        ) user_group_ids
+    from routes_permissions rp
+    left join user_groups_routes_permissions ugp
+        on ugp.route_permission_id = rp.id
+        and ugp.active = true
+    where rp.active = true
+    group by rp.id;
+
+end;
+$$;
@@ -1,9 +1,14 @@
 drop function if exists imfun_get_tags(varchar, integer, integer);
+drop function if exists imfun_get_tags(varchar, integer, integer, varchar, bigint);
+drop function if exists imfun_get_tags(varchar, integer, integer, varchar, bigint, varchar);
 
 create or replace function imfun_get_tags(
     _query varchar,
     _page integer,
-    _page_size integer
+    _page_size integer,
+    _cursor_name varchar default null,
+    _cursor_id bigint default null,
+    _search_mode varchar default 'substring'
 ) returns table (
     id bigint,
     name varchar
@@ -13,6 +18,10 @@ as $$
 
 declare
     _offset integer := (_page - 1) * _page_size;
+    _fulltext boolean := _query is not null and _search_mode = 'fulltext';
+    _tsquery tsquery := case
+        when _fulltext then websearch_to_tsquery('simple', _query)
+    end;
 
 begin
 
@@ -23,18 +32,22 @@ begin
     from
         tags t
     where
-        case
-            when _query is not null then
-                t.name ilike '%' || _query || '%'
-            else
-                true
-        end
+        (_query is null or _fulltext or t.name ilike '%' || _query || '%')
+        and (not _fulltext or to_tsvector('simple', t.name) @@ _tsquery)
+        and (
+            _cursor_id is null
+            or (t.name, t.id) > (_cursor_name, _cursor_id)
+        )
     order by
-        t.name
+        case
+            when _fulltext then ts_rank(to_tsvector('simple', t.name), _tsquery)
+        end desc nulls last,
+        t.name,
+        t.id
     limit
         _page_size
     offset
-        _offset;
+        case when _cursor_id is null then _offset else 0 end;
 
 end ;
 $$;
\ No newline at end of file
@@ -0,0 +1,16 @@
+drop function if exists imfun_get_user_version;
+
+-- what the ETag and Last-Modified of a user are derived from
+create or replace function imfun_get_user_version(
+    _id uuid
+) returns table (
+    id uuid,
+    modified_at timestamptz
+)
+language sql
+stable
+as $$
+    select u.id, u.updated_at
+    from users u
+    where u.id = _id;
+$$;
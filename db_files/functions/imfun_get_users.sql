@@ -3,7 +3,10 @@ drop function if exists imfun_get_users;
 create or replace function imfun_get_users(
     _query varchar,
     _page int,
-    _size int
+    _size int,
+    _cursor_updated_at timestamptz default null,
+    _cursor_id uuid default null,
+    _search_mode varchar default 'substring'
 )
 returns table(
     id uuid,
@@ -15,6 +18,10 @@ language plpgsql
 as $$
 declare
     _offset int := (_page - 1) * _size;
+    _fulltext boolean := _query is not null and _search_mode = 'fulltext';
+    _tsquery tsquery := case
+        when _fulltext then websearch_to_tsquery('simple', _query)
+    end;
 begin
     return query
     select
@@ -25,13 +32,22 @@ begin
     from
         users u
     where
-        case when _query is null then true else u.name ilike '%' || _query || '%' end
+        (_query is null or _fulltext or u.name ilike '%' || _query || '%')
+        and (not _fulltext or to_tsvector('simple', u.name) @@ _tsquery)
+        and (
+            _cursor_id is null
+            or (u.updated_at, u.id) < (_cursor_updated_at, _cursor_id)
+        )
     order by
-        u.updated_at desc
+        case
+            when _fulltext then ts_rank(to_tsvector('simple', u.name), _tsquery)
+        end desc nulls last,
+        u.updated_at desc,
+        u.id desc
     limit
         _size
     offset
-        _offset;
+        case when _cursor_id is null then _offset else 0 end;
 end;
 $$;
 
@@ -0,0 +1,32 @@
+drop function if exists imfun_import_notes;
+
+create or replace function imfun_import_notes(
+    _user_id uuid
+) returns table (
+    imported bigint
+)
+language plpgsql
+as $$
+
+begin
+    -- notes_import is the temporary staging table filled with COPY, ids are
+    -- taken up front so the tags are linked without reading the notes back
+    update notes_import
+    set note_id = nextval(pg_get_serial_sequence('notes', 'id'));
+
+    insert into notes (id, title, content, favorite, user_id)
+    select ni.note_id, ni.title, ni.content, ni.favorite, _user_id
+    from notes_import ni
+    order by ni.line;
+
+    insert into notes_tags (note_id, tag_id)
+    select distinct ni.note_id, t.id
+    from notes_import ni
+    cross join lateral unnest(ni.tags) note_tag(name)
+    join tags t on t.name = note_tag.name;
+
+    return query
+    select count(*)
+    from notes_import;
+end;
+$$;
@@ -8,7 +8,6 @@ language plpgsql
 as $$
 
 begin
-    insert into notes_likes (note_id, user_id)
-    values (_note_id, _user_id);
+    perform imfun_like_notes(array[_note_id], array[_user_id]);
 end;
-$$;
\ No newline at end of file
+$$;
@@ -0,0 +1,33 @@
+drop function if exists imfun_like_notes;
+
+create or replace function imfun_like_notes(
+    _note_ids bigint[],
+    _user_ids uuid[]
+) returns void
+language plpgsql
+as $$
+
+begin
+    -- likes already given (or repeated in the batch) are skipped, only the
+    -- new ones are added to the counters of the notes
+    with new_likes as (
+        insert into notes_likes (note_id, user_id)
+        select l.note_id, l.user_id
+        from unnest(_note_ids, _user_ids) l(note_id, user_id)
+        join notes n on n.id = l.note_id and n.active = true
+        order by l.note_id
+        on conflict (note_id, user_id) do nothing
+        returning notes_likes.note_id
+    ), counts as (
+        select nl.note_id, count(*) likes
+        from new_likes nl
+        group by nl.note_id
+    )
+    update notes n
+    set
+        like_count = n.like_count + c.likes,
+        liked_at = now()
+    from counts c
+    where n.id = c.note_id;
+end;
+$$;
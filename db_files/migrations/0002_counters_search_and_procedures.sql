@@ -0,0 +1,618 @@
+-- Schema changes made after creation.sql: request log batches, the
+-- permission table reloads, keyset pagination, search indexes, the note
+-- like counter, bulk import/export and the version probes
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+
+-- users
+
+create index if not exists users_updated_at_id_index on users (updated_at desc, id desc);
+create index if not exists users_name_trgm_index on users using gin (name gin_trgm_ops);
+create index if not exists users_name_tsv_index on users using gin (to_tsvector('simple', name));
+
+
+-- permissions
+
+INSERT INTO routes_permissions (route,"method","exclude")
+select r.route, r."method", r."exclude"
+from (VALUES
+	 ('/notes/bulk','POST',false),
+	 ('/notes/bulk','OPTIONS',true),
+	 ('/notes/export','GET',true),
+	 ('/notes/export','OPTIONS',true)
+) r(route, "method", "exclude")
+where not exists (
+    select 1
+    from routes_permissions rp
+    where rp.route = r.route and rp."method" = r."method"
+);
+
+INSERT INTO user_groups_routes_permissions (user_group_id,route_permission_id)
+select g.user_group_id, rp.id
+from (VALUES (1), (3)) g(user_group_id)
+join routes_permissions rp on rp.route = '/notes/bulk' and rp."method" = 'POST'
+where not exists (
+    select 1
+    from user_groups_routes_permissions ugp
+    where ugp.user_group_id = g.user_group_id and ugp.route_permission_id = rp.id
+);
+
+create or replace function notify_permissions_changed()
+returns trigger
+language plpgsql
+as $$
+begin
+    perform pg_notify('permissions_changed', tg_table_name);
+    return null;
+end;
+$$;
+
+drop trigger if exists notify_permissions_changed on routes_permissions;
+
+create trigger notify_permissions_changed
+after insert or update or delete or truncate on routes_permissions
+for each statement
+execute procedure notify_permissions_changed();
+
+drop trigger if exists notify_permissions_changed on user_groups_routes_permissions;
+
+create trigger notify_permissions_changed
+after insert or update or delete or truncate on user_groups_routes_permissions
+for each statement
+execute procedure notify_permissions_changed();
+
+
+-- notes
+
+alter table notes
+    add column if not exists like_count bigint not null default 0,
+    add column if not exists liked_at timestamptz null,
+    add column if not exists search_vector tsvector generated always as (
+        to_tsvector('simple', title || ' ' || content)
+    ) stored;
+
+-- likes only change like_count, they don't make the note newer
+drop trigger if exists update_updated_at on notes;
+
+create trigger update_updated_at
+before update of title, content, favorite, active on notes
+for each row
+execute procedure update_updated_at();
+
+create index if not exists notes_updated_at_id_index on notes (updated_at desc, id desc) where active = true;
+create index if not exists notes_title_trgm_index on notes using gin (title gin_trgm_ops);
+create index if not exists notes_search_vector_index on notes using gin (search_vector);
+
+
+-- tags
+
+create index if not exists tags_name_id_index on tags (name, id);
+create index if not exists tags_name_trgm_index on tags using gin (name gin_trgm_ops);
+create index if not exists tags_name_tsv_index on tags using gin (to_tsvector('simple', name));
+
+
+-- notes_likes, a user likes a note once
+
+delete from notes_likes nl
+using notes_likes older
+where
+    older.note_id = nl.note_id
+    and older.user_id = nl.user_id
+    and older.id < nl.id;
+
+drop index if exists notes_likes_note_id_index;
+create unique index if not exists notes_likes_note_id_user_id_index on notes_likes (note_id, user_id);
+
+-- the counters start from the likes already given, the trigger above keeps
+-- updated_at as it is
+update notes n
+set
+    like_count = l.likes,
+    liked_at = l.liked_at
+from (
+    select nl.note_id, count(*) likes, max(nl.created_at) liked_at
+    from notes_likes nl
+    group by nl.note_id
+) l
+where n.id = l.note_id;
+
+
+drop function if exists imfun_create_logs;
+
+create or replace function imfun_create_logs(
+    _user_ids uuid[],
+    _requests jsonb[],
+    _responses jsonb[],
+    _users_data jsonb[],
+    _urls varchar[]
+) returns void
+language plpgsql
+as $$
+
+begin
+
+    insert into logs (
+        user_id,
+        request,
+        response,
+        user_data,
+        route_permission_id
+    )
+    select
+        l.user_id,
+        l.request,
+        l.response,
+        l.user_data,
+        (
+            select rp.id
+            from routes_permissions rp
+            where rp.route ilike l.url
+            limit 1
+        )
+    from unnest(_user_ids, _requests, _responses, _users_data, _urls)
+        as l(user_id, request, response, user_data, url);
+end;
+$$;
+
+
+drop function if exists imfun_get_permissions;
+
+create or replace function imfun_get_permissions()
+returns table (
+    route varchar,
+    method varchar,
+    exclude boolean,
+    user_group_ids bigint[]
+)
+language plpgsql
+as $$
+
+begin
+
+    return query
+    select
+        rp.route,
+        rp.method,
+        rp."exclude",
+        coalesce(
+            array_agg(ugp.user_group_id) filter (where ugp.id is not null),
+            '{}'
+        ) user_group_ids
+    from routes_permissions rp
+    left join user_groups_routes_permissions ugp
+        on ugp.route_permission_id = rp.id
+        and ugp.active = true
+    where rp.active = true
+    group by rp.id;
+
+end;
+$$;
+
+
+drop function if exists imfun_get_note;
+
+create or replace function imfun_get_note(
+    _id bigint
+) returns table (
+    id bigint,
+    title varchar,
+    content text,
+    favorite boolean,
+    "user" jsonb,
+    tags jsonb,
+    total_likes bigint,
+    likes jsonb
+)
+language plpgsql
+as $$
+
+begin
+    return query
+    select n.id, n.title, n."content", n.favorite,
+        jsonb_build_object(
+            'id', u.id ,
+            'name', u."name"
+        ) "user",
+        coalesce(note_tags.tags, '[]') tags,
+        n.like_count total_likes,
+        coalesce(note_likes.likes, '[]') likes
+    from notes n
+    join users u on u.id = n.user_id
+    left join lateral (
+        select jsonb_agg(
+            jsonb_build_object(
+                'id', t.id,
+                'name', t."name"
+            )
+            order by t.name
+        ) tags
+        from notes_tags nt
+        join tags t on t.id = nt.tag_id
+        where nt.note_id = n.id and nt.active = true
+    ) note_tags on true
+    left join lateral (
+        select jsonb_agg(
+            jsonb_build_object(
+                'id', u2.id,
+                'name', u2."name"
+            )
+            order by nl.created_at
+        ) likes
+        from notes_likes nl
+        join users u2 on nl.user_id = u2.id
+        where nl.note_id = n.id
+    ) note_likes on true
+    where
+        n.active = true
+        and n.id = _id;
+end;
+$$;
+
+
+drop function if exists imfun_get_note_version;
+
+-- what the ETag and Last-Modified of a note are derived from, read by
+-- primary key without building the note
+create or replace function imfun_get_note_version(
+    _id bigint
+) returns table (
+    id bigint,
+    modified_at timestamptz,
+    likes bigint
+)
+language sql
+stable
+as $$
+    select n.id, greatest(n.updated_at, n.liked_at), n.like_count
+    from notes n
+    where
+        n.active = true
+        and n.id = _id;
+$$;
+
+
+drop function if exists imfun_get_notes;
+
+create or replace function imfun_get_notes(
+    _query varchar,
+    _page integer,
+    _page_size integer,
+    _name varchar,
+    _tags varchar[],
+    _favorites boolean,
+    _cursor_updated_at timestamptz default null,
+    _cursor_id bigint default null,
+    _search_mode varchar default 'substring'
+) returns table (
+    id bigint,
+    title varchar,
+    content text,
+    favorite boolean,
+    updated_at timestamptz,
+    "user" jsonb,
+    tags jsonb,
+    likes bigint
+)
+language plpgsql
+as $$
+
+declare
+    _offset integer := (_page - 1) * _page_size;
+    _fulltext boolean := _query is not null and _search_mode = 'fulltext';
+    _tsquery tsquery := case
+        when _fulltext then websearch_to_tsquery('simple', _query)
+    end;
+
+begin
+    -- the page is chosen first, tags are aggregated only for the notes of
+    -- the page
+    return query
+    with page as (
+        select
+            n.id,
+            n.updated_at,
+            case when _fulltext then ts_rank(n.search_vector, _tsquery) end rank
+        from notes n
+        where
+            n.active = true
+            and (_query is null or _fulltext or n.title ilike '%' || _query || '%')
+            and (not _fulltext or n.search_vector @@ _tsquery)
+            and (_name is null or n.title ilike '%' || _name || '%')
+            and (
+                _tags is null
+                or exists (
+                    select 1
+                    from notes_tags nt
+                    join tags t on t.id = nt.tag_id
+                    where
+                        nt.note_id = n.id
+                        and nt.active = true
+                        and t.name = any(_tags)
+                )
+            )
+            and (_favorites is null or n.favorite = _favorites)
+            and (
+                _cursor_id is null
+                or (n.updated_at, n.id) < (_cursor_updated_at, _cursor_id)
+            )
+        order by rank desc nulls last, n.updated_at desc, n.id desc
+        limit _page_size
+        offset case when _cursor_id is null then _offset else 0 end
+    )
+    select n.id, n.title, n."content", n.favorite, n.updated_at,
+        jsonb_build_object(
+            'id', u.id ,
+            'name', u."name"
+        ) "user",
+        coalesce(note_tags.tags, '[]') tags,
+        n.like_count likes
+    from page p
+    join notes n on n.id = p.id
+    join users u on u.id = n.user_id
+    left join lateral (
+        select jsonb_agg(
+            jsonb_build_object(
+                'id', t.id,
+                'name', t."name"
+            )
+            order by t.name
+        ) tags
+        from notes_tags nt
+        join tags t on t.id = nt.tag_id
+        where nt.note_id = n.id and nt.active = true
+    ) note_tags on true
+    order by p.rank desc nulls last, p.updated_at desc, p.id desc;
+
+end;
+$$;
+
+
+drop function if exists imfun_get_tags(varchar, integer, integer);
+drop function if exists imfun_get_tags(varchar, integer, integer, varchar, bigint);
+drop function if exists imfun_get_tags(varchar, integer, integer, varchar, bigint, varchar);
+
+create or replace function imfun_get_tags(
+    _query varchar,
+    _page integer,
+    _page_size integer,
+    _cursor_name varchar default null,
+    _cursor_id bigint default null,
+    _search_mode varchar default 'substring'
+) returns table (
+    id bigint,
+    name varchar
+)
+language plpgsql
+as $$
+
+declare
+    _offset integer := (_page - 1) * _page_size;
+    _fulltext boolean := _query is not null and _search_mode = 'fulltext';
+    _tsquery tsquery := case
+        when _fulltext then websearch_to_tsquery('simple', _query)
+    end;
+
+begin
+
+    return query
+    select
+        t.id,
+        t.name
+    from
+        tags t
+    where
+        (_query is null or _fulltext or t.name ilike '%' || _query || '%')
+        and (not _fulltext or to_tsvector('simple', t.name) @@ _tsquery)
+        and (
+            _cursor_id is null
+            or (t.name, t.id) > (_cursor_name, _cursor_id)
+        )
+    order by
+        case
+            when _fulltext then ts_rank(to_tsvector('simple', t.name), _tsquery)
+        end desc nulls last,
+        t.name,
+        t.id
+    limit
+        _page_size
+    offset
+        case when _cursor_id is null then _offset else 0 end;
+
+end ;
+$$;
+
+
+drop function if exists imfun_get_users;
+
+create or replace function imfun_get_users(
+    _query varchar,
+    _page int,
+    _size int,
+    _cursor_updated_at timestamptz default null,
+    _cursor_id uuid default null,
+    _search_mode varchar default 'substring'
+)
+returns table(
+    id uuid,
+    name varchar,
+    email varchar,
+    updated_at timestamptz
+) 
+language plpgsql
+as $$
+declare
+    _offset int := (_page - 1) * _size;
+    _fulltext boolean := _query is not null and _search_mode = 'fulltext';
+    _tsquery tsquery := case
+        when _fulltext then websearch_to_tsquery('simple', _query)
+    end;
+begin
+    return query
+    select
+        u.id,
+        u.name,
+        u.email,
+        u.updated_at
+    from
+        users u
+    where
+        (_query is null or _fulltext or u.name ilike '%' || _query || '%')
+        and (not _fulltext or to_tsvector('simple', u.name) @@ _tsquery)
+        and (
+            _cursor_id is null
+            or (u.updated_at, u.id) < (_cursor_updated_at, _cursor_id)
+        )
+    order by
+        case
+            when _fulltext then ts_rank(to_tsvector('simple', u.name), _tsquery)
+        end desc nulls last,
+        u.updated_at desc,
+        u.id desc
+    limit
+        _size
+    offset
+        case when _cursor_id is null then _offset else 0 end;
+end;
+$$;
+
+
+drop function if exists imfun_get_user_version;
+
+-- what the ETag and Last-Modified of a user are derived from
+create or replace function imfun_get_user_version(
+    _id uuid
+) returns table (
+    id uuid,
+    modified_at timestamptz
+)
+language sql
+stable
+as $$
+    select u.id, u.updated_at
+    from users u
+    where u.id = _id;
+$$;
+
+
+drop function if exists imfun_like_notes;
+
+create or replace function imfun_like_notes(
+    _note_ids bigint[],
+    _user_ids uuid[]
+) returns void
+language plpgsql
+as $$
+
+begin
+    -- likes already given (or repeated in the batch) are skipped, only the
+    -- new ones are added to the counters of the notes
+    with new_likes as (
+        insert into notes_likes (note_id, user_id)
+        select l.note_id, l.user_id
+        from unnest(_note_ids, _user_ids) l(note_id, user_id)
+        join notes n on n.id = l.note_id and n.active = true
+        order by l.note_id
+        on conflict (note_id, user_id) do nothing
+        returning notes_likes.note_id
+    ), counts as (
+        select nl.note_id, count(*) likes
+        from new_likes nl
+        group by nl.note_id
+    )
+    update notes n
+    set
+        like_count = n.like_count + c.likes,
+        liked_at = now()
+    from counts c
+    where n.id = c.note_id;
+end;
+$$;
+
+
+drop function if exists imfun_like_note;
+
+create or replace function imfun_like_note(
+    _note_id bigint,
+    _user_id uuid
+) returns void
+language plpgsql
+as $$
+
+begin
+    perform imfun_like_notes(array[_note_id], array[_user_id]);
+end;
+$$;
+
+
+drop function if exists imfun_import_notes;
+
+create or replace function imfun_import_notes(
+    _user_id uuid
+) returns table (
+    imported bigint
+)
+language plpgsql
+as $$
+
+begin
+    -- notes_import is the temporary staging table filled with COPY, ids are
+    -- taken up front so the tags are linked without reading the notes back
+    update notes_import
+    set note_id = nextval(pg_get_serial_sequence('notes', 'id'));
+
+    insert into notes (id, title, content, favorite, user_id)
+    select ni.note_id, ni.title, ni.content, ni.favorite, _user_id
+    from notes_import ni
+    order by ni.line;
+
+    insert into notes_tags (note_id, tag_id)
+    select distinct ni.note_id, t.id
+    from notes_import ni
+    cross join lateral unnest(ni.tags) note_tag(name)
+    join tags t on t.name = note_tag.name;
+
+    return query
+    select count(*)
+    from notes_import;
+end;
+$$;
+
+
+drop function if exists imfun_export_notes;
+
+-- plain sql so the query is inlined and a cursor over it streams the rows,
+-- a plpgsql function would build the whole result first
+create or replace function imfun_export_notes(
+    _user_id uuid default null
+) returns table (
+    id bigint,
+    title varchar,
+    content text,
+    favorite boolean,
+    user_id uuid,
+    tags varchar[],
+    likes bigint,
+    created_at timestamptz,
+    updated_at timestamptz
+)
+language sql
+stable
+as $$
+    select n.id, n.title, n."content", n.favorite, n.user_id,
+        array(
+            select t.name
+            from notes_tags nt
+            join tags t on t.id = nt.tag_id
+            where nt.note_id = n.id and nt.active = true
+            order by t.name
+        ) tags,
+        n.like_count likes,
+        n.created_at,
+        n.updated_at
+    from notes n
+    where
+        n.active = true
+        and (_user_id is null or n.user_id = _user_id)
+    order by n.id;
+$$;
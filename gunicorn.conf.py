@@ -0,0 +1,108 @@
+# Gunicorn settings, used as: gunicorn -c gunicorn.conf.py main:app
+# Every value can be overridden from the environment (.env).
+import os
+import shutil
+import multiprocessing
+
+# Env
+from decouple import config
+
+bind = config("GUNICORN_BIND", default="0.0.0.0:8000")
+
+# the workers are async, one per core keeps every core busy
+workers = config("WEB_CONCURRENCY", cast=int, default=multiprocessing.cpu_count())
+worker_class = "imagine.workers.UvicornWorker"
+
+# Postgres connections: every worker opens up to DB_POOL_MAX pooled
+# connections plus one LISTEN connection for the permissions. Unless
+# DB_POOL_MAX is set, what max_connections leaves after the reserved ones is
+# split between the workers, up to 10 each; the workers read it from the
+# environment.
+db_budget = config("DB_MAX_CONNECTIONS", cast=int, default=100) - config(
+    "DB_RESERVED_CONNECTIONS", cast=int, default=10
+)
+db_pool_max = config("DB_POOL_MAX", cast=int, default=0)
+if not db_pool_max:
+    db_pool_max = min(max(db_budget // workers - 1, 1), 10)
+    os.environ["DB_POOL_MAX"] = str(db_pool_max)
+if config("DB_POOL_MIN", cast=int, default=1) > db_pool_max:
+    os.environ["DB_POOL_MIN"] = str(db_pool_max)
+
+# SO_REUSEPORT on the listening socket, lets several gunicorn masters (or
+# a restarted one) share the port and the kernel balance between them
+reuse_port = config("GUNICORN_REUSE_PORT", cast=bool, default=False)
+backlog = config("GUNICORN_BACKLOG", cast=int, default=2048)
+
+# workers are recycled now and then, the jitter keeps them from all
+# restarting at the same time
+max_requests = config("GUNICORN_MAX_REQUESTS", cast=int, default=10000)
+max_requests_jitter = config("GUNICORN_MAX_REQUESTS_JITTER", cast=int, default=1000)
+
+# seconds a worker gets to finish its in-flight requests and run the
+# shutdown event (flushing logs and likes) before it is killed
+graceful_timeout = config("GUNICORN_GRACEFUL_TIMEOUT", cast=int, default=30)
+timeout = config("GUNICORN_TIMEOUT", cast=int, default=60)
+keepalive = config("GUNICORN_KEEPALIVE", cast=int, default=5)
+
+# the app is imported in every worker, connections are opened on first use
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+loglevel = config("GUNICORN_LOG_LEVEL", default="info")
+
+
+# directory shared by the workers for the metrics samples, served by the
+# master on their own bind, 0 disables it. Keep the port private, it is
+# not authorized like the API routes.
+metrics_dir = config("PROMETHEUS_MULTIPROC_DIR", default="")
+metrics_bind = config("METRICS_BIND", default="127.0.0.1")
+metrics_port = config("METRICS_PORT", cast=int, default=0)
+
+# .env values are not in the environment, prometheus_client reads this one
+# when it is first imported, which happens in the master (when_ready) before
+# the fork; the workers inherit the module and must write to the directory
+if metrics_dir:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", metrics_dir)
+
+
+def on_starting(server):
+    connections = workers * (db_pool_max + 1)
+    if connections > db_budget:
+        server.log.warning(
+            "%s workers may open %s Postgres connections, over the budget of %s "
+            "(DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS), lower DB_POOL_MAX "
+            "or WEB_CONCURRENCY",
+            workers,
+            connections,
+            db_budget,
+        )
+
+    # samples of a previous run would be summed with the new ones
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    if metrics_dir and metrics_port:
+        # the master aggregates the files, it has no samples of its own
+        from prometheus_client import CollectorRegistry, start_http_server
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=metrics_dir)
+        start_http_server(metrics_port, addr=metrics_bind, registry=registry)
+        server.log.info("serving metrics on %s:%s", metrics_bind, metrics_port)
+
+
+def worker_exit(server, worker):
+    server.log.info("worker %s exited", worker.pid)
+
+
+def child_exit(server, worker):
+    # drops the live gauges of the worker, its counters are kept
+    if metrics_dir:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid, metrics_dir)
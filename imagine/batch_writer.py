@@ -0,0 +1,169 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+OVERFLOW_POLICIES = ("drop", "sample", "block")
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Bounded in-process queue flushed by a background task in batches
+
+    Items are flushed when ``batch_size`` of them are waiting or when
+    ``interval`` seconds went by since the first item of the batch.
+
+    When the queue is full the ``overflow`` policy decides what happens:
+        - drop: the new item is discarded
+        - sample: one in ``sample_rate`` new items replaces the oldest queued
+          item, the rest are discarded
+        - block: the caller waits until there is room in the queue
+
+    A batch whose flush fails is retried ``retries`` times, ``retry_delay``
+    seconds apart, and then flushed one item at a time so a single bad item
+    only loses itself. With the default of no retries the batch is counted
+    as failed and discarded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush: Callable[[list], Awaitable[Any]],
+        max_size: int = 10000,
+        batch_size: int = 500,
+        interval: float = 1.0,
+        overflow: str = "drop",
+        sample_rate: int = 10,
+        retries: int = 0,
+        retry_delay: float = 0.5,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Overflow policy must be one of {OVERFLOW_POLICIES}")
+
+        self.name = name
+        self.flush = flush
+        self.batch_size = batch_size
+        self.interval = interval
+        self.overflow = overflow
+        self.sample_rate = max(sample_rate, 1)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.retried = 0
+        self._overflowed = 0
+        self._closed = False
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start the background writer on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def put(self, item: Any) -> None:
+        """Queue one item, applying the overflow policy when full
+
+        Args:
+            item (Any): item to write
+        """
+        if self._closed:
+            await self._write([item])
+            return
+
+        self.start()
+        try:
+            self.queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.overflow == "block":
+            await self.queue.put(item)
+            return
+
+        self._overflowed += 1
+        if self.overflow == "sample" and self._overflowed % self.sample_rate == 0:
+            try:
+                evicted = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                evicted = None
+            self.queue.put_nowait(_STOP if evicted is _STOP else item)
+        self.dropped += 1
+
+    def stats(self) -> dict[str, int]:
+        """Queue depth and counters of the writer"""
+        return {
+            "depth": self.queue.qsize(),
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+    async def close(self) -> None:
+        """Stop the background writer and flush everything still queued"""
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            await self.queue.put(_STOP)
+            await self._task
+        self._task = None
+
+        while not self.queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is not _STOP:
+                    batch.append(item)
+            if batch:
+                await self._write(batch)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stop = False
+        while not stop:
+            item = await self.queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch: list) -> None:
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                await asyncio.sleep(self.retry_delay * attempt)
+            try:
+                await self.flush(batch)
+                self.written += len(batch)
+                return
+            except Exception as e:
+                print(f"{self.name}: {e}", flush=True)
+
+        if self.retries and len(batch) > 1:
+            for item in batch:
+                await self._write_one(item)
+            return
+        self.failed += len(batch)
+
+    async def _write_one(self, item: Any) -> None:
+        try:
+            await self.flush([item])
+            self.written += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"{self.name}: dropped {item!r}: {e}", flush=True)
@@ -0,0 +1,146 @@
+import time
+import hashlib
+from collections import OrderedDict, defaultdict
+from typing import Any, Iterable
+
+# Metrics
+from imagine import metrics
+
+MAX_PARAMS_KEY_LENGTH = 64
+
+
+def namespace(key: str) -> str:
+    """Namespace of a cache key, the part before the first colon"""
+    return key.split(":", 1)[0]
+
+
+def parse_ttls(value: str) -> dict[str, float]:
+    """Parse "namespace=seconds" pairs separated by commas"""
+    ttls = {}
+    for item in value.split(","):
+        if "=" in item:
+            ns, ttl = item.split("=", 1)
+            ttls[ns.strip()] = float(ttl)
+    return ttls
+
+
+def _normalize(value: Any, case_sensitive: bool) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple, set)):
+        items = sorted({_normalize(item, case_sensitive) for item in value})
+        return ",".join(items)
+    value = str(value)
+    return value if case_sensitive else value.casefold()
+
+
+def params_key(params: dict[str, Any], case_sensitive: Iterable[str] = ()) -> str:
+    """Canonical cache key part for a set of query parameters
+
+    Missing (None) parameters are dropped, parameters are sorted by name,
+    lists are sorted and deduplicated and strings are case folded (the
+    searches use ilike) unless listed in ``case_sensitive``. Keys longer than
+    ``MAX_PARAMS_KEY_LENGTH`` are hashed.
+
+    Args:
+        params (dict[str, Any]): query parameters
+        case_sensitive (Iterable[str]): parameters compared case sensitively
+
+    Returns:
+        str: key, e.g. page=1&q=note&size=10
+    """
+    case_sensitive = set(case_sensitive)
+    key = "&".join(
+        f"{name}={_normalize(value, name in case_sensitive)}"
+        for name, value in sorted(params.items())
+        if value is not None
+    )
+    if len(key) > MAX_PARAMS_KEY_LENGTH:
+        return hashlib.sha256(key.encode()).hexdigest()
+    return key
+
+
+class LocalCache:
+    """Process-local LRU cache with a TTL per namespace
+
+    Only keys whose namespace has a TTL are kept, so values that must be
+    fresh on every read keep going to Redis.
+    """
+
+    def __init__(self, max_size: int, ttls: dict[str, float]) -> None:
+        self.max_size = max_size
+        self.ttls = ttls
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._stats: defaultdict[str, dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "evictions": 0}
+        )
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def cacheable(self, key: str) -> bool:
+        return self.ttls.get(namespace(key), 0) > 0
+
+    def get(self, key: str) -> Any | None:
+        """get the value of the key, None if missing or expired
+
+        Args:
+            key (str): key
+
+        Returns:
+            value (Any): value
+        """
+        if not self.cacheable(key):
+            return None
+
+        ns = namespace(key)
+        stats = self._stats[ns]
+        entry = self._data.get(key)
+        if entry is None:
+            stats["misses"] += 1
+            metrics.count_lookup(ns, "local", False)
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            stats["misses"] += 1
+            stats["evictions"] += 1
+            metrics.count_lookup(ns, "local", False)
+            return None
+
+        self._data.move_to_end(key)
+        stats["hits"] += 1
+        metrics.count_lookup(ns, "local", True)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """set the value of the key for its namespace TTL
+
+        Args:
+            key (str): key
+            value (Any): value
+        """
+        if not self.cacheable(key):
+            return
+
+        self._data[key] = (time.monotonic() + self.ttls[namespace(key)], value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            evicted, _ = self._data.popitem(last=False)
+            self._stats[namespace(evicted)]["evictions"] += 1
+
+    def delete(self, key: str) -> None:
+        """delete the key
+
+        Args:
+            key (str): key
+        """
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hits, misses and evictions per namespace"""
+        return {ns: dict(stats) for ns, stats in self._stats.items()}
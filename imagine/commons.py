@@ -1,2 +1,96 @@
-def general_get(q: str | None = None, page: int = 1, size: int = 10):
-    return {"q": q, "page": page, "size": size}
+import base64
+from enum import Enum
+from typing import Any, Callable
+
+from fastapi.exceptions import HTTPException
+
+from imagine import serializers
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class SearchMode(str, Enum):
+    substring = "substring"
+    fulltext = "fulltext"
+
+
+def general_get(
+    q: str | None = None,
+    page: int = 1,
+    size: int = 10,
+    cursor: str | None = None,
+    search_mode: SearchMode = SearchMode.substring,
+):
+    if cursor is not None and q is not None and search_mode == SearchMode.fulltext:
+        raise HTTPException(
+            status_code=400, detail="Fulltext results are ranked, use page instead"
+        )
+    return {
+        "q": q,
+        "page": page,
+        "size": size,
+        "cursor": cursor,
+        "search_mode": search_mode.value,
+    }
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque cursor for keyset pagination
+
+    Args:
+        values (Any): sort key values of the last row
+
+    Returns:
+        str: cursor
+    """
+    data = serializers.dumps(values)
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None, *converters: Callable) -> tuple:
+    """Sort key values of a cursor, converted in order
+
+    Args:
+        cursor (str | None): cursor sent by the client
+        converters (Callable): converter of each value
+
+    Raises:
+        HTTPException: if the cursor is not valid
+
+    Returns:
+        tuple: values, all None when there is no cursor
+    """
+    if cursor is None:
+        return (None,) * len(converters)
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = serializers.loads(data)
+        return tuple(
+            convert(value) for convert, value in zip(converters, values, strict=True)
+        )
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def next_cursor(rows: list | dict, pagination: dict, *columns: str) -> dict[str, str]:
+    """Headers with the cursor of the next page
+
+    Empty on the last page and for fulltext searches, which are ranked
+    instead of sorted by the cursor columns.
+
+    Args:
+        rows (list | dict): rows of the current page
+        pagination (dict): general_get parameters
+        columns (str): sort key columns
+
+    Returns:
+        dict[str, str]: headers
+    """
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not rows or len(rows) < pagination["size"]:
+        return {}
+    if pagination["q"] is not None and pagination["search_mode"] == SearchMode.fulltext:
+        return {}
+    last = rows[-1]
+    return {NEXT_CURSOR_HEADER: encode_cursor(*(last[column] for column in columns))}
@@ -1,49 +1,142 @@
 import os
-import json
+import time
+import asyncio
+from collections import namedtuple
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from threading import BoundedSemaphore, Lock
+from typing import Any, Callable, Iterator, AsyncIterator
+from uuid import uuid4
 from fastapi.exceptions import HTTPException
-from fastapi.encoders import jsonable_encoder
 
 # Redis
 from redis import Redis
-from redis.exceptions import ConnectionError
+from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.client import Pipeline as AsyncPipeline
+from redis.asyncio.lock import Lock as AsyncLock
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import ExponentialBackoff
+from redis.client import Pipeline
+from redis.exceptions import ConnectionError, LockError, ResponseError, TimeoutError
+from redis.retry import Retry
 
 # Psycopg2
 import psycopg2
-from psycopg2.extensions import connection
-from psycopg2.errors import InFailedSqlTransaction
+from psycopg2 import OperationalError, InterfaceError
+from psycopg2.extensions import connection, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import Json
+
+# Asyncpg
+import asyncpg
 
 # Env
 from decouple import config
 
+# Stored procedures
+from imagine import procedures
+
+# Serialization
+from imagine import serializers
+
+# Cache
+from imagine.cache import LocalCache, namespace, parse_ttls
+
+# Metrics
+from imagine import metrics
+
+_current_conn: ContextVar[connection | None] = ContextVar("db_connection", default=None)
+_current_aconn: ContextVar[asyncpg.Connection | None] = ContextVar(
+    "adb_connection", default=None
+)
+
+
+def _encode(value: str | dict | list) -> bytes | str:
+    """Serialize a value before storing it in Redis"""
+    if isinstance(value, dict) or isinstance(value, list):
+        return serializers.dumps(value)
+    return value
+
+
+def _decode(data: bytes | None) -> str | dict | list | None:
+    """Deserialize a value read from Redis, plain strings are returned as is"""
+    if data:
+        try:
+            return serializers.loads(data)
+        except serializers.JSONDecodeError:
+            return data.decode()
+
+
+ROW_MODES = ("dict", "tuple", "namedtuple")
+
+
+def _column_names(columns: list[str]) -> list[str]:
+    """Column names of a stored procedure result, without the "_" prefix"""
+    return [column[1:] if column.startswith("_") else column for column in columns]
+
+
+def _row_factory(columns: list[str], mode: str) -> Callable[[tuple], Any]:
+    """Build the function that turns a row into the requested row mode
+
+    Args:
+        columns (list[str]): column names, in row order
+        mode (str): dict, tuple (the row as is) or namedtuple
+
+    Returns:
+        Callable[[tuple], Any]: row converter
+    """
+    if mode == "dict":
+        return lambda row: dict(zip(columns, row))
+    if mode == "tuple":
+        return tuple
+    return namedtuple("Row", columns, rename=True)._make
+
+
+def _command_name(command: str | bytes) -> str:
+    if isinstance(command, bytes):
+        command = command.decode()
+    return command.upper()
+
+
+class TimedRedis(Redis):
+    """Redis client that times every command into metrics.REDIS_LATENCY"""
+
+    def execute_command(self, *args, **options):
+        with metrics.observe(metrics.REDIS_LATENCY, _command_name(args[0])):
+            return super().execute_command(*args, **options)
+
+
+class AsyncTimedRedis(AsyncRedis):
+    """Async Redis client that times every command into metrics.REDIS_LATENCY"""
+
+    async def execute_command(self, *args, **options):
+        with metrics.observe(metrics.REDIS_LATENCY, _command_name(args[0])):
+            return await super().execute_command(*args, **options)
+
 
 class RedisManager:
     def __init__(self) -> None:
         self.conn = self.connect()
 
     def connect(self) -> Redis:
-        """Connect to Redis"""
-        conn = Redis(
+        """Connect to Redis
+
+        Broken connections are checked and replaced by the client pool
+        (health_check_interval and retry), not by a PING before every call.
+        """
+        conn = TimedRedis(
             host=config("REDIS_HOST"),
             port=config("REDIS_PORT"),
             password=config("REDIS_PASS", default=None),
             db=config("REDIS_DB"),
-            decode_responses=True,
+            decode_responses=False,
+            health_check_interval=30,
+            retry=Retry(ExponentialBackoff(cap=1, base=0.05), 3),
+            retry_on_error=[ConnectionError, TimeoutError],
         )
         return conn
 
-    def _check_connection(func):
-        def wrapper(self, *args, **kwargs):
-            try:
-                self.conn.ping()
-            except ConnectionError:
-                self.conn = self._connect()
-            return
-            return func(self, *args, **kwargs)
-
-        return wrapper
-
-    @_check_connection
     def get(self, key: str) -> str | dict | list | None:
         """get the value of the key
 
@@ -53,14 +146,21 @@ class RedisManager:
         Returns:
             value (str): value
         """
-        data = self.conn.get(key)
-        if data:
-            try:
-                return json.loads(data)
-            except json.decoder.JSONDecodeError:
-                return self.conn.get(key)
+        return _decode(self.conn.get(key))
+
+    def get_many(self, keys: list[str]) -> list[str | dict | list | None]:
+        """get the values of several keys in one round trip
+
+        Args:
+            keys (list[str]): keys
+
+        Returns:
+            list: values, None for missing keys
+        """
+        if not keys:
+            return []
+        return [_decode(data) for data in self.conn.mget(keys)]
 
-    @_check_connection
     def create(self, key: str, value: str | dict, expire: int = 5) -> None:
         """set the value of the key
 
@@ -69,13 +169,27 @@ class RedisManager:
             value (str): value
             expire (int, optional): expire time in minutes. Defaults to None.
         """
-        if isinstance(value, dict) or isinstance(value, list):
-            value = json.dumps(value, default=jsonable_encoder)
+        self.conn.set(key, _encode(value), ex=expire * 60)
 
-        self.conn.set(key, value)
-        self.conn.expire(key, expire * 60)
+    def set_many(self, values: dict[str, str | dict | list], expire: int = 5) -> None:
+        """set several keys with the same expire time in one round trip
+
+        Args:
+            values (dict): values by key
+            expire (int, optional): expire time in minutes. Defaults to 5.
+        """
+        with self.pipeline() as pipe:
+            for key, value in values.items():
+                pipe.set(key, _encode(value), ex=expire * 60)
+
+    @contextmanager
+    def pipeline(self, transaction: bool = True) -> Iterator[Pipeline]:
+        """Queue commands and send them in one round trip on exit"""
+        with self.conn.pipeline(transaction=transaction) as pipe:
+            yield pipe
+            with metrics.observe(metrics.REDIS_LATENCY, "PIPELINE"):
+                pipe.execute()
 
-    @_check_connection
     def delete(self, key: str) -> None:
         """delete the key
 
@@ -85,116 +199,810 @@ class RedisManager:
         self.conn.delete(key)
 
 
+class PreparedConnection(connection):
+    """psycopg2 connection that remembers its prepared statements"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+
+
 class DBManager:
-    def __init__(self) -> None:
-        self.conn = self.connect()
+    def __init__(
+        self,
+        minconn: int | None = None,
+        maxconn: int | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        self.minconn = minconn or config("DB_POOL_MIN", cast=int, default=1)
+        self.maxconn = maxconn or config("DB_POOL_MAX", cast=int, default=10)
+        self.timeout = timeout or config("DB_POOL_TIMEOUT", cast=float, default=5)
+        self.check_interval = config("DB_POOL_CHECK_INTERVAL", cast=float, default=30)
+        self.itersize = config("DB_ITERSIZE", cast=int, default=2000)
+        self._slots = BoundedSemaphore(self.maxconn)
+        self._last_used: dict[int, float] = {}
+        self._lock = Lock()
+        self.pool: ThreadedConnectionPool | None = None
 
     def __del__(self) -> None:
-        self.conn.close()
+        self.close()
 
     def _check_connection(func):
         def wrapper(self, *args, **kwargs):
-            if self.conn.closed:
-                self.conn = self.connect()
             try:
                 return func(self, *args, **kwargs)
-            except InFailedSqlTransaction:
-                self.conn.rollback()
-                self.conn.close()
-                self.conn = self.connect()
-                return func(self, *args, **kwargs)
+            except HTTPException:
+                raise
             except Exception as e:
-                if not self.conn.closed:
-                    self.conn.rollback()
-                    self.conn.close()
-                self.conn = self.connect()
                 detail = "Something went wrong with the database: "
                 raise HTTPException(status_code=500, detail=detail + str(e))
 
         return wrapper
 
-    def connect(self) -> connection:
-        """Connect to database"""
-        conn = psycopg2.connect(
+    def connect(self) -> ThreadedConnectionPool:
+        """Create the connection pool, opening ``minconn`` connections"""
+        pool = ThreadedConnectionPool(
+            self.minconn,
+            self.maxconn,
             host=config("DB_HOST"),
             dbname=config("DB_NAME"),
             user=config("DB_USER"),
             password=config("DB_PASS"),
             port=config("DB_PORT"),
+            connection_factory=PreparedConnection,
         )
-        return conn
+        return pool
+
+    def close(self) -> None:
+        """Close every connection of the pool"""
+        pool = getattr(self, "pool", None)
+        if pool is not None and not pool.closed:
+            pool.closeall()
+        self.pool = None
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        """The pool is created on first use, importing the module is free"""
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    self.pool = self.connect()
+        return self.pool
+
+    def _healthy(self, conn: connection) -> bool:
+        """Check a connection before handing it out
+
+        Closed or broken connections are discarded right away, connections
+        idle for longer than ``check_interval`` are pinged first.
+        """
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        last_used = self._last_used.get(id(conn), 0)
+        if time.monotonic() - last_used < self.check_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("select 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except (OperationalError, InterfaceError):
+            return False
+
+    def _checkout(self) -> connection:
+        """Take a healthy connection from the pool
+
+        Raises:
+            HTTPException: if no connection is released before ``timeout``
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HTTPException(
+                status_code=503, detail="Database connection pool exhausted"
+            )
+        try:
+            pool = self._get_pool()
+            while True:
+                conn = pool.getconn()
+                if self._healthy(conn):
+                    return conn
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn: connection) -> None:
+        """Give a connection back to the pool"""
+        broken = conn.closed or (
+            conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN
+        )
+        if broken:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        self.pool.putconn(conn, close=broken)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[connection]:
+        """Scope one pooled connection to the current context
+
+        Every ``fetch_one``, ``fetch_all`` and ``execute_sp`` call made inside
+        the block reuses the same connection, which is committed and released
+        when the block exits.
+        """
+        conn = _current_conn.get()
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._checkout()
+        token = _current_conn.set(conn)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            _current_conn.reset(token)
+            self._checkin(conn)
 
     @_check_connection
-    def fetch_one(self, stm: str) -> dict:
+    def fetch_one(self, stm: str, *args) -> dict:
         """Fetch one row"""
-        cur = self.conn.cursor()
-        cur.execute(stm)
-        if cur.rowcount > 0:
-            columns = [column[0] for column in cur.description]
-            data = dict(zip(columns, cur.fetchone()))
+        with self.connection() as conn:
+            cur = conn.cursor()
+            with metrics.observe(metrics.DB_LATENCY, "fetch_one"):
+                cur.execute(stm, args or None)
+            if cur.rowcount > 0:
+                columns = [column[0] for column in cur.description]
+                data = dict(zip(columns, cur.fetchone()))
+                cur.close()
+                return data
             cur.close()
-            return data
-        cur.close()
 
     @_check_connection
-    def fetch_all(self, stm: str) -> list:
+    def fetch_all(self, stm: str, *args) -> list:
         """Fetch all rows"""
-        cur = self.conn.cursor()
-        cur.execute(stm)
-        if cur.rowcount > 0:
-            columns = [column[0] for column in cur.description]
-            data = [dict(zip(columns, row)) for row in cur.fetchall()]
+        with self.connection() as conn:
+            cur = conn.cursor()
+            with metrics.observe(metrics.DB_LATENCY, "fetch_all"):
+                cur.execute(stm, args or None)
+            if cur.rowcount > 0:
+                columns = [column[0] for column in cur.description]
+                data = [dict(zip(columns, row)) for row in cur.fetchall()]
+                cur.close()
+                return data
             cur.close()
-            return data
-        cur.close()
 
     @_check_connection
-    def execute_sp(self, sp: str, *args: str) -> dict:
+    def execute_sp(self, sp: str, *args) -> dict:
         """Execute stored procedure
 
+        The statement is prepared once per connection, later calls only send
+        the values.
+
         Args:
-            sp (str): Stored procedure name
-            args (str): Arguments for stored procedure (value::type)
+            sp (str): Stored procedure name, declared in imagine.procedures
+            args (Any): Arguments for stored procedure, in signature order
 
         Returns:
             dict[str, str]: Message
         """
+        args = self._adapt(sp, args)
+
+        with self.connection() as conn:
+            cur = conn.cursor()
+            with metrics.observe(metrics.DB_LATENCY, sp):
+                if sp not in conn.prepared:
+                    cur.execute(procedures.prepare_statement(sp))
+                    conn.prepared.add(sp)
+                cur.execute(procedures.execute_statement(sp), args)
+                conn.commit()
+            columns = _column_names([column[0] for column in cur.description])
+
+            data = [dict(zip(columns, row)) for row in cur.fetchall()]
+            cur.close()
+        if len(data) == 1:
+            return data[0]
+        return data
+
+    @staticmethod
+    def _adapt(sp: str, args: tuple) -> list:
+        """Wrap json arguments of a stored procedure for psycopg2"""
+        return [
+            Json(arg, dumps=serializers.dumps_str)
+            if kind in ("json", "jsonb") and arg is not None
+            else arg
+            for arg, kind in zip(args, procedures.signature(sp))
+        ]
+
+    def iter_rows(
+        self,
+        stm: str,
+        *args,
+        itersize: int | None = None,
+        mode: str = "dict",
+        strip_prefix: bool = False,
+    ) -> Iterator:
+        """Iterate the rows of a query through a named server side cursor
+
+        Only ``itersize`` rows are fetched at a time. The connection stays
+        checked out until the iterator is exhausted or closed.
+
+        Args:
+            stm (str): statement, psycopg2 placeholders
+            args (Any): statement arguments
+            itersize (int | None): rows per round trip, DB_ITERSIZE by default
+            mode (str): row mode, dict, tuple or namedtuple
+            strip_prefix (bool): remove the "_" prefix of the column names
+
+        Raises:
+            ValueError: if the row mode is unknown
+
+        Yields:
+            Any: one row in the requested mode
+        """
+        if mode not in ROW_MODES:
+            raise ValueError(f"Row mode must be one of {ROW_MODES}")
+
+        try:
+            with self.connection() as conn:
+                cur = conn.cursor(name=f"iter_rows_{uuid4().hex}")
+                cur.itersize = itersize or self.itersize
+                try:
+                    cur.execute(stm, args or None)
+                    make_row = None
+                    for row in cur:
+                        if make_row is None:
+                            columns = [column[0] for column in cur.description]
+                            if strip_prefix:
+                                columns = _column_names(columns)
+                            make_row = _row_factory(columns, mode)
+                        yield make_row(row)
+                finally:
+                    cur.close()
+        except HTTPException:
+            raise
+        except Exception as e:
+            detail = "Something went wrong with the database: "
+            raise HTTPException(status_code=500, detail=detail + str(e))
+
+    def stream_sp(
+        self, sp: str, *args, itersize: int | None = None, mode: str = "dict"
+    ) -> Iterator:
+        """Iterate the rows of a stored procedure, see iter_rows
+
+        Args:
+            sp (str): Stored procedure name, declared in imagine.procedures
+            args (Any): Arguments for stored procedure, in signature order
+            itersize (int | None): rows per round trip, DB_ITERSIZE by default
+            mode (str): row mode, dict, tuple or namedtuple
+
+        Yields:
+            Any: one row in the requested mode
+        """
+        yield from self.iter_rows(
+            procedures.select_statement(sp),
+            *self._adapt(sp, args),
+            itersize=itersize,
+            mode=mode,
+            strip_prefix=True,
+        )
+
+
+class AsyncRedisManager:
+    def __init__(self, local: LocalCache | None = None) -> None:
+        self.conn = self.connect()
+        self.local = local
+        self.invalidation_channel = "cache:invalidate"
+        self._invalidation_task: asyncio.Task | None = None
+
+    def connect(self) -> AsyncRedis:
+        """Connect to Redis, connections are opened on first use"""
+        conn = AsyncTimedRedis(
+            host=config("REDIS_HOST"),
+            port=config("REDIS_PORT"),
+            password=config("REDIS_PASS", default=None),
+            db=config("REDIS_DB"),
+            decode_responses=False,
+            health_check_interval=30,
+            retry=AsyncRetry(ExponentialBackoff(cap=1, base=0.05), 3),
+            retry_on_error=[ConnectionError, TimeoutError],
+        )
+        return conn
+
+    async def close(self) -> None:
+        """Close every connection of the client"""
+        if self._invalidation_task is not None:
+            self._invalidation_task.cancel()
+            self._invalidation_task = None
+        await self.conn.close()
+
+    def listen_invalidations(self) -> None:
+        """Evict local entries deleted by any worker"""
+        if self.local is None:
+            return
+        if self._invalidation_task is None or self._invalidation_task.done():
+            self._invalidation_task = asyncio.create_task(self._invalidations())
+
+    async def _invalidations(self) -> None:
+        while True:
+            try:
+                pubsub = self.conn.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.invalidation_channel)
+                # entries may have been deleted while we were not subscribed
+                self.local.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.local.delete(message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e, flush=True)
+                await asyncio.sleep(1)
+
+    async def get(self, key: str) -> str | dict | list | None:
+        """get the value of the key
+
+        Args:
+            key (str): key
+
+        Returns:
+            value (str): value
+        """
+        if self.local is not None and (value := self.local.get(key)) is not None:
+            return value
+
+        value = _decode(await self.conn.get(key))
+        metrics.count_lookup(namespace(key), "redis", value is not None)
+        if value is not None and self.local is not None:
+            self.local.set(key, value)
+        return value
+
+    async def get_many(self, keys: list[str]) -> list[str | dict | list | None]:
+        """get the values of several keys in one round trip
+
+        Args:
+            keys (list[str]): keys
+
+        Returns:
+            list: values, None for missing keys
+        """
+        values = [
+            self.local.get(key) if self.local is not None else None for key in keys
+        ]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+
+        for i, data in zip(missing, await self.conn.mget([keys[i] for i in missing])):
+            values[i] = _decode(data)
+            metrics.count_lookup(namespace(keys[i]), "redis", values[i] is not None)
+            if values[i] is not None and self.local is not None:
+                self.local.set(keys[i], values[i])
+        return values
+
+    async def create(self, key: str, value: str | dict, expire: int = 5) -> None:
+        """set the value of the key
+
+        Args:
+            key (str): key
+            value (str): value
+            expire (int, optional): expire time in minutes. Defaults to None.
+        """
+        if self.local is not None:
+            self.local.set(key, value)
+
+        await self.conn.set(key, _encode(value), ex=expire * 60)
+
+    async def set_many(
+        self, values: dict[str, str | dict | list], expire: int = 5
+    ) -> None:
+        """set several keys with the same expire time in one round trip
+
+        Args:
+            values (dict): values by key
+            expire (int, optional): expire time in minutes. Defaults to 5.
+        """
+        async with self.pipeline() as pipe:
+            for key, value in values.items():
+                if self.local is not None:
+                    self.local.set(key, value)
+                pipe.set(key, _encode(value), ex=expire * 60)
+
+    async def get_fields(self, key: str) -> dict[bytes, bytes] | None:
+        """get every field of a hash key, values are not deserialized
 
-        cur = self.conn.cursor()
-        stm = f"select * from {sp}({', '.join(args)})"
-        cur.execute(stm)
-        self.conn.commit()
-        columns = []
+        Args:
+            key (str): key
+
+        Returns:
+            dict[bytes, bytes] | None: fields, None if missing or not a hash
+        """
+        if self.local is not None and (fields := self.local.get(key)) is not None:
+            return fields
+
+        try:
+            fields = await self.conn.hgetall(key)
+        except ResponseError:
+            fields = None
+        metrics.count_lookup(namespace(key), "redis", bool(fields))
+        if not fields:
+            return None
+        if self.local is not None:
+            self.local.set(key, fields)
+        return fields
+
+    async def create_fields(
+        self, key: str, fields: dict[bytes, bytes], expire: float = 5
+    ) -> None:
+        """replace a hash key with the given fields
+
+        Args:
+            key (str): key
+            fields (dict[bytes, bytes]): raw field values by name
+            expire (float, optional): expire time in minutes. Defaults to 5.
+        """
+        if self.local is not None:
+            self.local.set(key, fields)
 
-        for column in cur.description:
-            if column[0].startswith("_"):
-                columns.append(column[0][1:])
-            else:
-                columns.append(column[0])
+        async with self.pipeline() as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, max(int(expire * 60), 1))
+
+    async def try_lock(self, key: str, timeout: float) -> AsyncLock | None:
+        """take the lock of a key without waiting, shared by every worker
+
+        Args:
+            key (str): key to lock
+            timeout (float): seconds after which the lock is released anyway
+
+        Returns:
+            AsyncLock | None: the lock, None if someone else holds it
+        """
+        lock = self.conn.lock(f"lock:{key}", timeout=timeout, blocking=False)
+        if await lock.acquire():
+            return lock
+        return None
+
+    async def unlock(self, lock: AsyncLock) -> None:
+        """release a lock taken with try_lock, if it did not time out yet"""
+        try:
+            await lock.release()
+        except LockError:
+            pass
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = True) -> AsyncIterator[AsyncPipeline]:
+        """Queue commands and send them in one round trip on exit
+
+        Commands queued on the pipeline skip the local cache.
+        """
+        async with self.conn.pipeline(transaction=transaction) as pipe:
+            yield pipe
+            with metrics.observe(metrics.REDIS_LATENCY, "PIPELINE"):
+                await pipe.execute()
+
+    async def delete(self, key: str) -> None:
+        """delete the key, also from the local cache of every worker
+
+        Args:
+            key (str): key
+        """
+        await self.conn.delete(key)
+        await self._evict_local(key)
+
+    async def _evict_local(self, key: str) -> None:
+        if self.local is not None:
+            self.local.delete(key)
+            await self.conn.publish(self.invalidation_channel, key)
+
+    async def generation(self, namespace: str) -> int:
+        """current generation of a namespace
+
+        Args:
+            namespace (str): namespace
+
+        Returns:
+            int: generation, 0 until the namespace is invalidated once
+        """
+        return int(await self.get(f"generation:{namespace}") or 0)
+
+    async def namespace_key(self, namespace: str, *parts) -> str:
+        """build a key inside the current generation of a namespace
+
+        Args:
+            namespace (str): namespace, e.g. notes
+            parts (Any): rest of the key
+
+        Returns:
+            str: key, e.g. notes:v3:None:1:10
+        """
+        generation = await self.generation(namespace)
+        return ":".join([namespace, f"v{generation}", *map(str, parts)])
 
-        data = [dict(zip(columns, row)) for row in cur.fetchall()]
-        cur.close()
+    async def invalidate(self, namespace: str) -> None:
+        """invalidate every key of a namespace in O(1)
+
+        Bumping the generation makes every key built before unreachable,
+        the old keys expire on their own.
+
+        Args:
+            namespace (str): namespace
+        """
+        key = f"generation:{namespace}"
+        await self.conn.incr(key)
+        await self._evict_local(key)
+
+
+class AsyncDBManager:
+    def __init__(
+        self,
+        min_size: int | None = None,
+        max_size: int | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        self.min_size = min_size or config("DB_POOL_MIN", cast=int, default=1)
+        self.max_size = max_size or config("DB_POOL_MAX", cast=int, default=10)
+        self.timeout = timeout or config("DB_POOL_TIMEOUT", cast=float, default=5)
+        self.itersize = config("DB_ITERSIZE", cast=int, default=2000)
+        self.pool: asyncpg.Pool | None = None
+        self.listeners: list[asyncpg.Connection] = []
+        self._lock = asyncio.Lock()
+
+    def _check_connection(func):
+        async def wrapper(self, *args, **kwargs):
+            try:
+                return await func(self, *args, **kwargs)
+            except HTTPException:
+                raise
+            except Exception as e:
+                detail = "Something went wrong with the database: "
+                raise HTTPException(status_code=500, detail=detail + str(e))
+
+        return wrapper
+
+    @staticmethod
+    def _connect_kwargs() -> dict:
+        return {
+            "host": config("DB_HOST"),
+            "database": config("DB_NAME"),
+            "user": config("DB_USER"),
+            "password": config("DB_PASS"),
+            "port": config("DB_PORT", cast=int),
+        }
+
+    async def connect(self) -> asyncpg.Pool:
+        """Create the connection pool"""
+        pool = await asyncpg.create_pool(
+            **self._connect_kwargs(),
+            min_size=self.min_size,
+            max_size=self.max_size,
+            init=self._init_connection,
+        )
+        return pool
+
+    async def listen(self, channel: str, callback: Callable) -> asyncpg.Connection:
+        """Listen to a NOTIFY channel on a dedicated connection
+
+        Args:
+            channel (str): channel name
+            callback (Callable): called as callback(conn, pid, channel, payload)
+
+        Returns:
+            asyncpg.Connection: the listening connection
+        """
+        conn = await asyncpg.connect(**self._connect_kwargs())
+        await conn.add_listener(channel, callback)
+        self.listeners.append(conn)
+        return conn
+
+    async def close(self) -> None:
+        """Close every connection of the pool"""
+        while self.listeners:
+            await self.listeners.pop().close()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @staticmethod
+    async def _init_connection(conn: asyncpg.Connection) -> None:
+        """Decode json and uuid values the same way psycopg2 does"""
+        for json_type in ("json", "jsonb"):
+            await conn.set_type_codec(
+                json_type,
+                encoder=serializers.dumps_str,
+                decoder=serializers.loads,
+                schema="pg_catalog",
+            )
+        await conn.set_type_codec(
+            "uuid", encoder=str, decoder=str, schema="pg_catalog", format="text"
+        )
+
+    def stats(self) -> dict[str, int]:
+        """Open, idle and maximum connections of the pool"""
+        if self.pool is None:
+            return {"size": 0, "idle": 0, "max": self.max_size}
+        return {
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+            "max": self.pool.get_max_size(),
+        }
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self.pool is None:
+            async with self._lock:
+                if self.pool is None:
+                    self.pool = await self.connect()
+        return self.pool
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[asyncpg.Connection]:
+        """Scope one pooled connection to the current task
+
+        Raises:
+            HTTPException: if no connection is released before ``timeout``
+        """
+        conn = _current_aconn.get()
+        if conn is not None:
+            yield conn
+            return
+
+        pool = await self._get_pool()
+        try:
+            conn = await pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503, detail="Database connection pool exhausted"
+            )
+        token = _current_aconn.set(conn)
+        try:
+            yield conn
+        finally:
+            _current_aconn.reset(token)
+            await pool.release(conn)
+
+    @_check_connection
+    async def fetch_one(self, stm: str, *args) -> dict:
+        """Fetch one row"""
+        async with self.connection() as conn:
+            with metrics.observe(metrics.DB_LATENCY, "fetch_one"):
+                row = await conn.fetchrow(stm, *args)
+        if row is not None:
+            return dict(row)
+
+    @_check_connection
+    async def fetch_all(self, stm: str, *args) -> list:
+        """Fetch all rows"""
+        async with self.connection() as conn:
+            with metrics.observe(metrics.DB_LATENCY, "fetch_all"):
+                rows = await conn.fetch(stm, *args)
+        if rows:
+            return [dict(row) for row in rows]
+
+    @_check_connection
+    async def execute_sp(self, sp: str, *args) -> dict:
+        """Execute stored procedure
+
+        asyncpg keeps the prepared statement in the cache of each connection,
+        so the procedure is parsed and planned once per connection.
+
+        Args:
+            sp (str): Stored procedure name, declared in imagine.procedures
+            args (Any): Arguments for stored procedure, in signature order
+
+        Returns:
+            dict[str, str]: Message
+        """
+        async with self.connection() as conn:
+            with metrics.observe(metrics.DB_LATENCY, sp):
+                rows = await conn.fetch(procedures.call_statement(sp), *args)
+
+        if not rows:
+            return []
+        columns = _column_names(list(rows[0].keys()))
+        data = [dict(zip(columns, row)) for row in rows]
         if len(data) == 1:
             return data[0]
         return data
-    
-    def create_db(self, file):
-        cur = self.conn.cursor()
+
+    async def iter_rows(
+        self,
+        stm: str,
+        *args,
+        itersize: int | None = None,
+        mode: str = "dict",
+        strip_prefix: bool = False,
+    ) -> AsyncIterator:
+        """Iterate the rows of a query through a server side cursor
+
+        Only ``itersize`` rows are fetched at a time, so the rows can feed a
+        StreamingResponse directly. The connection stays checked out until
+        the iterator is exhausted or closed.
+
+        Args:
+            stm (str): statement, $n placeholders
+            args (Any): statement arguments
+            itersize (int | None): rows per round trip, DB_ITERSIZE by default
+            mode (str): row mode, dict, tuple or namedtuple
+            strip_prefix (bool): remove the "_" prefix of the column names
+
+        Raises:
+            ValueError: if the row mode is unknown
+
+        Yields:
+            Any: one row in the requested mode
+        """
+        if mode not in ROW_MODES:
+            raise ValueError(f"Row mode must be one of {ROW_MODES}")
 
         try:
-            with open(file, "r") as f:
-                sql = f.read()
-                cur.execute(sql)
-                self.conn.commit()
+            async with self.connection() as conn:
+                async with conn.transaction():
+                    make_row = None
+                    async for row in conn.cursor(
+                        stm, *args, prefetch=itersize or self.itersize
+                    ):
+                        if make_row is None:
+                            columns = list(row.keys())
+                            if strip_prefix:
+                                columns = _column_names(columns)
+                            make_row = _row_factory(columns, mode)
+                        yield make_row(row)
+        except HTTPException:
+            raise
         except Exception as e:
-            print(e, flush=True)
-            self.conn.rollback()
-        cur.close()
+            detail = "Something went wrong with the database: "
+            raise HTTPException(status_code=500, detail=detail + str(e))
+
+    async def stream_sp(
+        self, sp: str, *args, itersize: int | None = None, mode: str = "dict"
+    ) -> AsyncIterator:
+        """Iterate the rows of a stored procedure, see iter_rows
 
+        Args:
+            sp (str): Stored procedure name, declared in imagine.procedures
+            args (Any): Arguments for stored procedure, in signature order
+            itersize (int | None): rows per round trip, DB_ITERSIZE by default
+            mode (str): row mode, dict, tuple or namedtuple
 
+        Yields:
+            Any: one row in the requested mode
+        """
+        async for row in self.iter_rows(
+            procedures.call_statement(sp),
+            *args,
+            itersize=itersize,
+            mode=mode,
+            strip_prefix=True,
+        ):
+            yield row
+
+
+# Sync managers, kept for scripts; connections are opened on first use
 db = DBManager()
 rd = RedisManager()
 
-
-def get_rd() -> RedisManager:
-    return rd
+# Async managers, used by the views and the middleware
+adb = AsyncDBManager()
+ard = AsyncRedisManager(
+    LocalCache(
+        max_size=config("CACHE_LOCAL_SIZE", cast=int, default=1024),
+        ttls=config(
+            "CACHE_LOCAL_TTLS",
+            cast=parse_ttls,
+            default="user_data=30,generation=5",
+        ),
+    )
+    if config("CACHE_LOCAL_ENABLED", cast=bool, default=True)
+    else None
+)
+
+
+def get_rd() -> AsyncRedisManager:
+    return ard
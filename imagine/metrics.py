@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# Env
+from decouple import config
+
+# Shared by every gunicorn worker, each one writes its samples there and the
+# gunicorn master serves them all on METRICS_PORT (see gunicorn.conf.py),
+# never on the API port. prometheus_client reads the variable when it is
+# imported, so it is exported from .env first.
+MULTIPROC_DIR = config("PROMETHEUS_MULTIPROC_DIR", default="")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", MULTIPROC_DIR)
+
+# Prometheus
+from prometheus_client import Counter, Gauge, Histogram  # noqa: E402
+
+# seconds between two samples of the pool and queue stats
+SAMPLE_INTERVAL = config("METRICS_SAMPLE_INTERVAL", cast=float, default=5)
+
+# requests to routes missing from routes_permissions share this label
+OTHER_ROUTE = "other"
+
+FAST_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of the requests by route template",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests being served",
+    multiprocess_mode="livesum",
+)
+DB_LATENCY = Histogram(
+    "db_statement_duration_seconds",
+    "Latency of the database calls by stored procedure",
+    ["statement"],
+    buckets=FAST_BUCKETS,
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Latency of the Redis calls by command",
+    ["command"],
+    buckets=FAST_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups by namespace, tier (local or redis) and result",
+    ["namespace", "tier", "result"],
+)
+POOL_STATS = Gauge(
+    "pool_stat",
+    "Stats of the connection pools, writers and thread pools of each worker",
+    ["pool", "stat"],
+    multiprocess_mode="liveall",
+)
+
+
+@contextmanager
+def observe(histogram: Histogram, *labels: str) -> Iterator[None]:
+    """Time the block into a histogram, also when it raises
+
+    Args:
+        histogram (Histogram): histogram
+        labels (str): label values of the histogram
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(*labels).observe(time.perf_counter() - start)
+
+
+def count_lookup(namespace: str, tier: str, hit: bool) -> None:
+    """Count a cache lookup
+
+    Args:
+        namespace (str): namespace of the key
+        tier (str): local or redis
+        hit (bool): True if the key was found
+    """
+    CACHE_LOOKUPS.labels(namespace, tier, "hit" if hit else "miss").inc()
+
+
+class Sampler:
+    """Copies the stats of pools and queues into POOL_STATS periodically
+
+    The stats live in each worker and the master that serves the metrics
+    has none of them, so every worker samples its own and the files of the
+    shared directory carry them to the scrape.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.sources: dict[str, Callable[[], dict]] = {}
+        self._task: asyncio.Task | None = None
+
+    def add(self, pool: str, stats: Callable[[], dict]) -> None:
+        """Sample a stats function, e.g. BatchWriter.stats
+
+        Args:
+            pool (str): pool label
+            stats (Callable[[], dict]): returns the stats by name, only
+                numeric values are kept
+        """
+        self.sources[pool] = stats
+
+    def sample(self) -> None:
+        for pool, stats in self.sources.items():
+            for stat, value in stats().items():
+                if isinstance(value, (int, float)):
+                    POOL_STATS.labels(pool, stat).set(value)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                print(e, flush=True)
+            await asyncio.sleep(self.interval)
+
+
+sampler = Sampler()
+
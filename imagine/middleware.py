@@ -1,88 +1,153 @@
 import time
 import re
-import json
-from json import JSONDecodeError
 from uuid import UUID
-from jose import jwt
-from starlette.middleware.base import BaseHTTPMiddleware, DispatchFunction
-from fastapi import FastAPI, Response, Request
-from starlette.types import Message
-from imagine.db_manager import db, rd
-from auth.views.auth import get_current_user
+from fastapi import Response, Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from imagine.db_manager import adb, ard
+from imagine.batch_writer import BatchWriter
+from imagine.permissions import permissions
+from imagine import metrics, serializers
+from auth.services.tokens import current_user_data
 from decouple import config
 
 
-class AsyncIteratorWrapper:
-    def __init__(self, obj):
-        self._it = iter(obj)
+async def _write_logs(logs: list[dict]) -> None:
+    """Insert a batch of request logs with a single statement"""
+    await adb.execute_sp(
+        "imfun_create_logs",
+        [log["user_id"] for log in logs],
+        [log["request"] for log in logs],
+        [log["response"] for log in logs],
+        [log["user_data"] for log in logs],
+        [log["url"] for log in logs],
+    )
+
+
+logs_writer = BatchWriter(
+    "logs_writer",
+    _write_logs,
+    max_size=config("LOGS_QUEUE_SIZE", cast=int, default=10000),
+    batch_size=config("LOGS_BATCH_SIZE", cast=int, default=500),
+    interval=config("LOGS_FLUSH_INTERVAL", cast=float, default=1.0),
+    overflow=config("LOGS_OVERFLOW", default="drop"),
+    sample_rate=config("LOGS_SAMPLE_RATE", cast=int, default=10),
+)
+
+
+class BodyCapture:
+    """Keeps at most ``limit`` bytes of a body that is streamed through"""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.chunks: list[bytes] = []
+        self.size = 0
+        self.truncated = False
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        room = self.limit - self.size
+        if room > 0:
+            part = chunk[:room]
+            self.chunks.append(part)
+            self.size += len(part)
+        if len(chunk) > room:
+            self.truncated = True
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.chunks)
+
+    def loggable(self) -> dict | list | str | None:
+        """Body as json when it was fully captured, otherwise as text"""
+        body = self.getvalue()
+        if not body:
+            return None
+        if not self.truncated:
+            try:
+                return serializers.loads(body)
+            except serializers.JSONDecodeError:
+                pass
+        text = body.decode(errors="replace")
+        if self.truncated:
+            text += "...(truncated)"
+        return text
 
-    def __aiter__(self):
-        return self
 
-    async def __anext__(self):
-        try:
-            value = next(self._it)
-        except StopIteration:
-            raise StopAsyncIteration
-        return value
+class LogsMiddleware:
+    """Pure ASGI middleware that validates permissions and logs every request
 
+    Request and response bodies are passed through untouched while only the
+    first ``body_limit`` bytes of each one are kept for the log.
+    """
 
-class LogsMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: FastAPI) -> None:
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, body_limit: int | None = None) -> None:
         self.app = app
+        self.body_limit = body_limit or config("LOGS_BODY_LIMIT", cast=int, default=4096)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-    async def dispatch(self, request: Request, call_next) -> Response:
-        await self.set_body(request)
-        user_dict, user_id = self._log_user(request)
+        request = Request(scope)
+        user_dict, user_id = await self._log_user(request)
         url = self._url_convertion(request.url.path)
         method = request.method
 
-        response, response_dict = await self._log_response(
-            call_next, request, user_dict, url, method
-        )
-        request_dict = await self._log_request(request)
-
-        self._create_log(request_dict, response_dict, user_dict, url, user_id)
-
-        return response
-
-    async def set_body(self, request: Request):
-        """Avails the response body to be logged within a middleware as,
-        it is generally not a standard practice.
-
-           Arguments:
-           - request: Request
-           Returns:
-           - receive_: Receive
-        """
-        receive_ = await request._receive()
-
-        async def receive() -> Message:
-            return receive_
-
-        request._receive = receive
-
-    def _log_user(self, request: Request) -> tuple[dict, int]:
+        request_body = BodyCapture(self.body_limit)
+        response_body = BodyCapture(self.body_limit)
+        status_code = 500
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.write(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_body.write(message.get("body", b""))
+            await send(message)
+
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        start_time = time.perf_counter()
+        try:
+            if await self._validate_permission(user_dict, url, method):
+                await self.app(scope, receive_wrapper, send_wrapper)
+            else:
+                response = Response(status_code=403, content="Forbidden")
+                await response(scope, receive, send_wrapper)
+        finally:
+            execution_time = time.perf_counter() - start_time
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            # unknown paths share one label, they must not grow the series
+            route = url if permissions.known(url) else metrics.OTHER_ROUTE
+            metrics.REQUEST_LATENCY.labels(method, route, str(status_code)).observe(
+                execution_time
+            )
+            response_dict = {
+                "status_code": status_code,
+                "time_taken": f"{execution_time:0.4f}s",
+                "body": response_body.loggable(),
+            }
+            request_dict = self._log_request(request, request_body)
+            await self._create_log(request_dict, response_dict, user_dict, url, user_id)
+
+    async def _log_user(self, request: Request) -> tuple[dict, int]:
         token = request.headers.get("Authorization", None)
         if not token:
             return {}, None
 
-        token = token.split(" ")[1]
         try:
-            payload = jwt.decode(token, config("SECRET_KEY"), algorithms=["HS256"])
-            email: str = payload.get("email")
-            if email is None:
-                return {}, None
-            if (cache_data := rd.get(f"user_data:{email}")) is not None:
-                return cache_data, cache_data.get("id")
-            else:
-                user_data = db.execute_sp("imfun_get_user_data", f"'{email}'::varchar")
-                return user_data, user_data.get("id")
+            user_data = await current_user_data(request, token.split(" ")[1], ard)
+            return user_data, user_data.get("id")
         except Exception as e:
             return {}, None
 
-    async def _log_request(self, request: Request) -> str:
+    def _log_request(self, request: Request, body: BodyCapture) -> dict:
         path = request.url.path
         if request.query_params:
             path += f"?{request.query_params}"
@@ -90,72 +155,27 @@ class LogsMiddleware(BaseHTTPMiddleware):
         request_logging = {
             "method": request.method,
             "path": path,
-            "ip": request.client.host,
+            "ip": request.client.host if request.client else None,
             "headers": dict(request.headers),
         }
 
-        try:
-            body = await request.json()
-            if "password" in body:
-                body = "Sensitive data"
-            request_logging["body"] = body
-        except JSONDecodeError:
-            body = await request.body()
-            if "password" in body.decode():
-                body = "Sensitive data"
-            else:
-                body = body.decode()
-            request_logging["body"] = body
-        except Exception as e:
-            request_logging["body"] = None
-
-        return request_logging
-
-    async def _log_response(
-        self, call_next, request: Request, user_dict: dict, url: str, method: str
-    ) -> Response:
-        start_time = time.perf_counter()
-
-        validate = self._validate_permission(user_dict, url, method)
-        if not validate:
-            resp_body = "Forbidden"
-            response = Response(status_code=403, content=resp_body)
+        if b"password" in body.getvalue():
+            request_logging["body"] = "Sensitive data"
         else:
-            response: Response = await call_next(request)
-            resp_body = [
-                section async for section in response.__dict__["body_iterator"]
-            ]
-            response.__setattr__("body_iterator", AsyncIteratorWrapper(resp_body))
-
-            try:
-                resp_body = json.loads(resp_body[0].decode())
-            except:
-                resp_body = str(resp_body)
-
-        finish_time = time.perf_counter()
-
-        execution_time = finish_time - start_time
-
-        response_logging = {
-            "status_code": response.status_code,
-            "time_taken": f"{execution_time:0.4f}s",
-        }
-        response_logging["body"] = resp_body
+            request_logging["body"] = body.loggable()
 
-        return response, response_logging
+        return request_logging
 
-    def _create_log(self, request_log, response_log, user_log, url, user_id):
-        try:
-            db.execute_sp(
-                "imfun_create_log",
-                f"'{user_id}'::uuid" if user_id else "NULL::uuid",
-                f"'{json.dumps(request_log)}'::jsonb",
-                f"'{json.dumps(response_log)}'::jsonb",
-                f"'{json.dumps(user_log)}'::jsonb",
-                f"'{url}'::varchar",
-            )
-        except Exception as e:
-            print(e, flush=True)
+    async def _create_log(self, request_log, response_log, user_log, url, user_id):
+        await logs_writer.put(
+            {
+                "user_id": user_id,
+                "request": request_log,
+                "response": response_log,
+                "user_data": user_log,
+                "url": url,
+            }
+        )
 
     def _valid_uuid(self, string):
         try:
@@ -184,27 +204,14 @@ class LogsMiddleware(BaseHTTPMiddleware):
         url = "/".join(url)
         return url
 
-    def _validate_permission(self, user_dict: dict, url: str, method: str) -> bool:
+    async def _validate_permission(self, user_dict: dict, url: str, method: str) -> bool:
         
         if url in ["/docs", "/redoc", "/openapi.json"]:
             return True
         
         user_group = user_dict.get("group", {}).get("id", None)
 
-        rd_key = f"permission:{user_group}:{url}:{method}"
-        
-        rd_permission = rd.get(rd_key)
-        
-        if rd_permission is not None:
-            return rd_permission == "True"
-
-        permission = db.execute_sp(
-            "imfun_get_user_permissions",
-            f"{user_group}::int8" if user_group else "NULL::int8",
-            f"'{url}'::varchar",
-            f"'{method}'::varchar",
-        )['permission']
-        
-        rd.create(rd_key, str(permission), 60)
-        
-        return permission
+        if not permissions.loaded:
+            await permissions.load()
+
+        return permissions.allowed(user_group, url, method)
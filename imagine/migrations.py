@@ -0,0 +1,194 @@
+import os
+import re
+import hashlib
+import argparse
+
+# Psycopg2
+import psycopg2
+from psycopg2.extensions import connection
+
+# Env
+from decouple import config
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "db_files",
+    "migrations",
+)
+
+# e.g. 0002_notes_like_count.sql
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# key of the advisory lock held while migrating, one runner at a time
+LOCK_KEY = 41_700_001
+
+# 0001 is the old creation.sql, databases created with it have its tables
+# but no schema_migrations rows
+BASELINE_VERSION = 1
+BASELINE_TABLE = "public.users"
+
+SCHEMA_MIGRATIONS = """
+create table if not exists schema_migrations (
+    version integer primary key,
+    name varchar(255) not null,
+    checksum varchar(64) not null,
+    applied_at timestamptz not null default now()
+)
+"""
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    def __init__(self, version: int, name: str, path: str) -> None:
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, "r") as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode()).hexdigest()
+
+    def __repr__(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> list[Migration]:
+    """Migrations of a directory, sorted by version
+
+    Args:
+        directory (str): directory with the NNNN_name.sql files
+
+    Raises:
+        MigrationError: if two files have the same version
+
+    Returns:
+        list[Migration]: migrations
+    """
+    migrations: dict[int, Migration] = {}
+    for file in sorted(os.listdir(directory)):
+        if (match := MIGRATION_FILE.match(file)) is None:
+            continue
+        version, name = int(match.group(1)), match.group(2)
+        if version in migrations:
+            raise MigrationError(f"Duplicated migration version {version}")
+        migrations[version] = Migration(version, name, os.path.join(directory, file))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def connect() -> connection:
+    """Dedicated connection, migrations never go through the app pool"""
+    return psycopg2.connect(
+        host=config("DB_HOST"),
+        dbname=config("DB_NAME"),
+        user=config("DB_USER"),
+        password=config("DB_PASS"),
+        port=config("DB_PORT"),
+    )
+
+
+def migrate(
+    conn: connection,
+    migrations: list[Migration],
+    baseline: int | None = None,
+) -> list[Migration]:
+    """Apply the migrations that are not in schema_migrations yet
+
+    Each migration runs in its own transaction and is recorded with the
+    checksum of its file. Applied migrations are skipped when their checksum
+    matches, an edited applied migration is an error.
+
+    Args:
+        conn (connection): connection
+        migrations (list[Migration]): migrations, sorted by version
+        baseline (int | None): record the migrations up to this version as
+            applied without running them, for databases created before the
+            migrations existed. When None and nothing is recorded yet but the
+            tables of 0001 exist, BASELINE_VERSION is used.
+
+    Raises:
+        MigrationError: if an applied migration changed
+
+    Returns:
+        list[Migration]: applied migrations
+    """
+    cur = conn.cursor()
+    cur.execute("select pg_advisory_lock(%s)", (LOCK_KEY,))
+    try:
+        cur.execute(SCHEMA_MIGRATIONS)
+        conn.commit()
+
+        cur.execute("select version, checksum from schema_migrations")
+        applied = dict(cur.fetchall())
+
+        if baseline is None and not applied:
+            cur.execute("select to_regclass(%s) is not null", (BASELINE_TABLE,))
+            if cur.fetchone()[0]:
+                baseline = BASELINE_VERSION
+                print(
+                    f"existing schema without migrations, recording up to "
+                    f"{baseline:04d} as applied",
+                    flush=True,
+                )
+
+        done = []
+        for migration in migrations:
+            checksum = applied.get(migration.version)
+            if checksum == migration.checksum:
+                continue
+            if checksum is not None:
+                raise MigrationError(
+                    f"Migration {migration} changed after it was applied"
+                )
+
+            try:
+                if baseline is None or migration.version > baseline:
+                    cur.execute(migration.sql)
+                cur.execute(
+                    "insert into schema_migrations (version, name, checksum) "
+                    "values (%s, %s, %s)",
+                    (migration.version, migration.name, migration.checksum),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            done.append(migration)
+        return done
+    finally:
+        cur.execute("select pg_advisory_unlock(%s)", (LOCK_KEY,))
+        conn.commit()
+        cur.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply the database migrations")
+    parser.add_argument(
+        "--baseline",
+        type=int,
+        default=None,
+        help="record the migrations up to this version without running them",
+    )
+    parser.add_argument("--directory", default=MIGRATIONS_DIR)
+    args = parser.parse_args()
+
+    try:
+        conn = connect()
+        try:
+            applied = migrate(conn, discover(args.directory), baseline=args.baseline)
+        finally:
+            conn.close()
+    except (MigrationError, psycopg2.Error) as e:
+        # a short reason instead of a traceback in the container logs
+        raise SystemExit(f"migrations failed: {str(e).strip()}")
+
+    if applied:
+        for migration in applied:
+            print(f"applied {migration}", flush=True)
+    else:
+        print("database is up to date", flush=True)
+
+
+if __name__ == "__main__":
+    main()
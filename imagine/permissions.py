@@ -0,0 +1,86 @@
+import asyncio
+
+from asyncpg import Connection
+
+# DB
+from imagine.db_manager import adb
+
+PERMISSIONS_CHANNEL = "permissions_changed"
+
+
+class PermissionTable:
+    """In-memory copy of routes_permissions and user_groups_routes_permissions
+
+    The table is loaded once and reloaded whenever Postgres notifies a change
+    on ``PERMISSIONS_CHANNEL``, so checking a permission never leaves the
+    process.
+    """
+
+    def __init__(self, channel: str = PERMISSIONS_CHANNEL) -> None:
+        self.channel = channel
+        self.public: frozenset[tuple[str, str]] = frozenset()
+        self.granted: frozenset[tuple[int, str, str]] = frozenset()
+        self.routes: frozenset[str] = frozenset()
+        self.loaded = False
+        self._listener: Connection | None = None
+
+    async def load(self) -> None:
+        """Load every active route permission from the database"""
+        rows = await adb.fetch_all("select * from imfun_get_permissions()") or []
+
+        public = set()
+        granted = set()
+        routes = set()
+        for row in rows:
+            routes.add(row["route"])
+            if row["exclude"]:
+                public.add((row["route"], row["method"]))
+            for group_id in row["user_group_ids"]:
+                granted.add((group_id, row["route"], row["method"]))
+
+        self.public, self.granted = frozenset(public), frozenset(granted)
+        self.routes = frozenset(routes)
+        self.loaded = True
+
+    def allowed(self, group_id: int | None, url: str, method: str) -> bool:
+        """check if a user group can call a route
+
+        Args:
+            group_id (int | None): user group id
+            url (str): route template, as returned by _url_convertion
+            method (str): http method
+
+        Returns:
+            bool: permission
+        """
+        return (url, method) in self.public or (group_id, url, method) in self.granted
+
+    def known(self, url: str) -> bool:
+        """check if a route template is declared in routes_permissions"""
+        return url in self.routes
+
+    async def listen(self) -> None:
+        """Reload the table every time the permissions tables change"""
+        self._listener = await adb.listen(self.channel, self._on_notify)
+        self._listener.add_termination_listener(self._on_terminate)
+
+    def _on_notify(self, conn, pid, channel, payload) -> None:
+        asyncio.create_task(self.load())
+
+    def _on_terminate(self, conn) -> None:
+        if conn in adb.listeners:
+            adb.listeners.remove(conn)
+            asyncio.create_task(self._relisten())
+
+    async def _relisten(self, delay: float = 5) -> None:
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.listen()
+                await self.load()
+                return
+            except Exception as e:
+                print(e, flush=True)
+
+
+permissions = PermissionTable()
@@ -0,0 +1,105 @@
+from functools import cache
+
+# Stored procedures signatures, the types of every argument in order
+PROCEDURES: dict[str, tuple[str, ...]] = {
+    "imfun_create_log": ("uuid", "jsonb", "jsonb", "jsonb", "varchar"),
+    "imfun_create_logs": ("uuid[]", "jsonb[]", "jsonb[]", "jsonb[]", "varchar[]"),
+    "imfun_create_note": ("varchar", "varchar", "varchar[]", "boolean", "uuid"),
+    "imfun_create_tag": ("varchar",),
+    "imfun_export_notes": ("uuid",),
+    "imfun_get_note": ("bigint",),
+    "imfun_get_note_version": ("bigint",),
+    "imfun_get_notes": (
+        "varchar",
+        "integer",
+        "integer",
+        "varchar",
+        "varchar[]",
+        "boolean",
+        "timestamptz",
+        "bigint",
+        "varchar",
+    ),
+    "imfun_get_permissions": (),
+    "imfun_get_tags": (
+        "varchar",
+        "integer",
+        "integer",
+        "varchar",
+        "bigint",
+        "varchar",
+    ),
+    "imfun_get_user": ("uuid",),
+    "imfun_get_user_data": ("varchar",),
+    "imfun_get_user_version": ("uuid",),
+    "imfun_get_user_permissions": ("bigint", "varchar", "varchar"),
+    "imfun_get_users": (
+        "varchar",
+        "integer",
+        "integer",
+        "timestamptz",
+        "uuid",
+        "varchar",
+    ),
+    "imfun_import_notes": ("uuid",),
+    "imfun_like_note": ("bigint", "uuid"),
+    "imfun_like_notes": ("bigint[]", "uuid[]"),
+    "imfun_patch_note": (
+        "bigint",
+        "varchar",
+        "varchar",
+        "varchar[]",
+        "boolean",
+        "uuid",
+    ),
+    "imfun_signup_user": ("varchar", "varchar", "varchar", "bigint"),
+    "imfun_update_user": ("uuid", "varchar", "varchar", "bigint"),
+}
+
+
+def signature(sp: str) -> tuple[str, ...]:
+    """get the argument types of a stored procedure
+
+    Args:
+        sp (str): stored procedure name
+
+    Raises:
+        ValueError: if the stored procedure is not declared
+
+    Returns:
+        tuple[str, ...]: argument types
+    """
+    try:
+        return PROCEDURES[sp]
+    except KeyError:
+        raise ValueError(f"Stored procedure {sp} is not declared")
+
+
+@cache
+def call_statement(sp: str) -> str:
+    """Statement with typed bind parameters ($1::type, ...)"""
+    params = [f"${i}::{kind}" for i, kind in enumerate(signature(sp), start=1)]
+    return f"select * from {sp}({', '.join(params)})"
+
+
+@cache
+def select_statement(sp: str) -> str:
+    """Statement with typed psycopg2 placeholders (%s::type, ...)"""
+    params = [f"%s::{kind}" for kind in signature(sp)]
+    return f"select * from {sp}({', '.join(params)})"
+
+
+@cache
+def prepare_statement(sp: str) -> str:
+    """Server side PREPARE statement, named after the stored procedure"""
+    types = signature(sp)
+    params = ", ".join(f"${i}" for i in range(1, len(types) + 1))
+    arg_types = f" ({', '.join(types)})" if types else ""
+    return f"prepare {sp}{arg_types} as select * from {sp}({params})"
+
+
+@cache
+def execute_statement(sp: str) -> str:
+    """EXECUTE statement for a prepared stored procedure (psycopg2 placeholders)"""
+    params = ", ".join(["%s"] * len(signature(sp)))
+    return f"execute {sp}({params})" if params else f"execute {sp}"
@@ -0,0 +1,303 @@
+import time
+import random
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable
+
+# FastAPI
+from fastapi import Request, Response
+
+# Env
+from decouple import config
+
+# Serialization
+from imagine import serializers
+
+# DB
+from imagine.db_manager import AsyncRedisManager
+
+MEDIA_TYPE = "application/json"
+
+# seconds a stale body is still served while it is refreshed in the background
+STALE_TTL = config("CACHE_STALE_TTL", cast=float, default=60)
+# expire times are spread by +/- this fraction so keys don't expire together
+TTL_JITTER = config("CACHE_TTL_JITTER", cast=float, default=0.1)
+# seconds a worker may hold the lock of a key while it loads it
+LOCK_TIMEOUT = config("CACHE_LOCK_TIMEOUT", cast=float, default=10)
+# seconds the other workers wait for that key before loading it themselves
+LOCK_WAIT = config("CACHE_LOCK_WAIT", cast=float, default=2)
+LOCK_POLL_INTERVAL = 0.05
+
+# extra headers are kept in fields named after them, e.g. h:X-Next-Cursor
+_HEADER_PREFIX = b"h:"
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag of a response body"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def http_date(value: datetime) -> str:
+    """Format a timestamp as an HTTP date, e.g. for Last-Modified"""
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def validators(version: dict) -> tuple[str, str]:
+    """ETag and Last-Modified of a resource version
+
+    Args:
+        version (dict): row of a version probe (imfun_get_*_version), its
+            ``modified_at`` column is the Last-Modified date
+
+    Returns:
+        tuple[str, str]: ETag and Last-Modified headers
+    """
+    etag = make_etag(":".join(str(value) for value in version.values()).encode())
+    return etag, http_date(version["modified_at"])
+
+
+def conditional(request: Request) -> bool:
+    """True if the request carries If-None-Match or If-Modified-Since"""
+    return (
+        "if-none-match" in request.headers or "if-modified-since" in request.headers
+    )
+
+
+def not_modified(
+    request: Request, etag: str, last_modified: str | None = None
+) -> bool:
+    """check the validators of the request against the current ones
+
+    If-None-Match wins over If-Modified-Since when both are sent.
+
+    Args:
+        request (Request): request
+        etag (str): current ETag of the resource
+        last_modified (str | None): current Last-Modified of the resource
+
+    Returns:
+        bool: True if the client already has this version
+    """
+    header = request.headers.get("if-none-match")
+    if header:
+        if header.strip() == "*":
+            return True
+        tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+        return etag in tags
+
+    since = request.headers.get("if-modified-since")
+    if not since or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(since)
+    except (TypeError, ValueError):
+        return False
+
+
+def unchanged(request: Request, version: dict) -> Response | None:
+    """304 response when the client has the probed version
+
+    Args:
+        request (Request): request
+        version (dict): row of a version probe
+
+    Returns:
+        Response | None: 304 response, None if the client copy is outdated
+    """
+    etag, last_modified = validators(version)
+    if not_modified(request, etag, last_modified):
+        return Response(
+            status_code=304, headers={"ETag": etag, "Last-Modified": last_modified}
+        )
+    return None
+
+
+def respond(
+    request: Request,
+    body: bytes,
+    etag: str,
+    media_type: str = MEDIA_TYPE,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """Response for an already serialized body, 304 if the client has it
+
+    Args:
+        request (Request): request
+        body (bytes): serialized body
+        etag (str): ETag of the body
+        media_type (str): content type of the body
+        headers (dict[str, str] | None): extra headers
+
+    Returns:
+        Response: 200 with the body or 304 without it
+    """
+    headers = {**(headers or {}), "ETag": etag}
+    if not_modified(request, etag, headers.get("Last-Modified")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def render(
+    content: Any,
+    headers: dict[str, str] | None = None,
+    version: dict | None = None,
+) -> dict[bytes, bytes]:
+    """Serialize content once, as the fields of a cached response
+
+    Args:
+        content (Any): response content
+        headers (dict[str, str] | None): extra headers, cached with the body
+        version (dict | None): row of a version probe, the ETag and
+            Last-Modified come from it instead of a hash of the body
+
+    Returns:
+        dict[bytes, bytes]: body, etag, media_type and header fields
+    """
+    body = serializers.dumps(content)
+    headers = dict(headers or {})
+    if version:
+        etag, headers["Last-Modified"] = validators(version)
+    else:
+        etag = make_etag(body)
+
+    fields = {
+        b"body": body,
+        b"etag": etag.encode(),
+        b"media_type": MEDIA_TYPE.encode(),
+    }
+    for name, value in headers.items():
+        fields[_HEADER_PREFIX + name.encode()] = value.encode()
+    return fields
+
+
+def _respond_fields(request: Request, fields: dict[bytes, bytes]) -> Response:
+    headers = {
+        name[len(_HEADER_PREFIX):].decode(): value.decode()
+        for name, value in fields.items()
+        if name.startswith(_HEADER_PREFIX)
+    }
+    return respond(
+        request,
+        fields[b"body"],
+        fields[b"etag"].decode(),
+        fields[b"media_type"].decode(),
+        headers,
+    )
+
+
+def _fresh(fields: dict[bytes, bytes]) -> bool:
+    return float(fields.get(b"fresh_until", 0)) > time.time()
+
+
+# loads running in this worker, by key, so concurrent misses share one
+_loading: dict[str, asyncio.Task] = {}
+
+
+async def _store(
+    cache: AsyncRedisManager, key: str, fields: dict[bytes, bytes], expire: float
+) -> None:
+    """Cache fields, fresh for a jittered ``expire`` then stale for STALE_TTL"""
+    fresh = expire * 60 * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)
+    fields = {**fields, b"fresh_until": str(time.time() + fresh).encode()}
+    await cache.create_fields(key, fields, (fresh + STALE_TTL) / 60)
+
+
+async def _wait(cache: AsyncRedisManager, key: str) -> dict[bytes, bytes] | None:
+    """Wait up to LOCK_WAIT for another worker to load a key"""
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        fields = await cache.get_fields(key)
+        if fields is not None and _fresh(fields):
+            return fields
+    return None
+
+
+async def _load(
+    cache: AsyncRedisManager,
+    key: str,
+    fetch: Callable[[], Awaitable[dict[bytes, bytes]]],
+    expire: float,
+    wait: bool,
+) -> dict[bytes, bytes] | None:
+    """Fetch and cache a key while holding its lock
+
+    When another worker holds the lock, a foreground load (``wait``) waits
+    for its result and a background refresh gives up.
+    """
+    lock = await cache.try_lock(key, LOCK_TIMEOUT)
+    if lock is None:
+        if not wait:
+            return None
+        if (fields := await _wait(cache, key)) is not None:
+            return fields
+
+    try:
+        fields = await fetch()
+        await _store(cache, key, fields, expire)
+        return fields
+    finally:
+        if lock is not None:
+            await cache.unlock(lock)
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and (e := task.exception()) is not None:
+        print(e, flush=True)
+
+
+def _start_load(
+    cache: AsyncRedisManager,
+    key: str,
+    fetch: Callable[[], Awaitable[dict[bytes, bytes]]],
+    expire: float,
+    wait: bool,
+) -> asyncio.Task:
+    task = _loading.get(key)
+    if task is None:
+        task = asyncio.create_task(_load(cache, key, fetch, expire, wait))
+        _loading[key] = task
+        task.add_done_callback(lambda _: _loading.pop(key, None))
+        task.add_done_callback(_log_failure)
+    return task
+
+
+async def cached(
+    cache: AsyncRedisManager,
+    key: str,
+    request: Request,
+    fetch: Callable[[], Awaitable[dict[bytes, bytes]]],
+    expire: float = 5,
+) -> Response:
+    """Serve a cached response, loading it once when missing or stale
+
+    - fresh: the stored body is sent as is
+    - stale (less than STALE_TTL past its jittered expiry): the stored body
+      is sent and one background task refreshes it
+    - missing: one request per key loads it while the others, in this and
+      in the other workers, wait for its result
+
+    Args:
+        cache (AsyncRedisManager): cache
+        key (str): key
+        request (Request): request
+        fetch (Callable): builds the fields of the response, see render
+        expire (float, optional): fresh time in minutes. Defaults to 5.
+
+    Returns:
+        Response: response
+    """
+    fields = await cache.get_fields(key)
+    if fields is not None and b"body" in fields:
+        if not _fresh(fields):
+            _start_load(cache, key, fetch, expire, wait=False)
+        return _respond_fields(request, fields)
+
+    task = _start_load(cache, key, fetch, expire, wait=True)
+    fields = await asyncio.shield(task)
+    if fields is None:
+        # joined a background refresh that found the lock taken
+        fields = await fetch()
+    return _respond_fields(request, fields)
@@ -0,0 +1,67 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+# UUID, datetime, date and time are serialized natively by orjson
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+JSONDecodeError = orjson.JSONDecodeError
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not know, converted like jsonable_encoder does"""
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize a value to JSON bytes
+
+    Args:
+        value (Any): value
+
+    Returns:
+        bytes: JSON document
+    """
+    return orjson.dumps(value, default=_default, option=OPTIONS)
+
+
+def dumps_str(value: Any) -> str:
+    """Serialize a value to a JSON string, for drivers that want text"""
+    return dumps(value).decode()
+
+
+def loads(data: bytes | str) -> Any:
+    """Deserialize a JSON document
+
+    Args:
+        data (bytes | str): JSON document
+
+    Raises:
+        JSONDecodeError: if the document is not valid JSON
+
+    Returns:
+        Any: value
+    """
+    return orjson.loads(data)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with ``dumps`` in a single pass
+
+    The content is not run through jsonable_encoder first, rows coming from
+    the database are serialized as they are.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,11 @@
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    """Uvicorn worker for gunicorn with uvloop and httptools selected
+
+    The base worker picks them with "auto" only when they import, this one
+    fails at boot if they are missing instead of silently running slower.
+    """
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools", "lifespan": "on"}
@@ -1,6 +1,5 @@
-import os
-
 # Starlette
+from anyio import to_thread
 from starlette.middleware.cors import CORSMiddleware
 
 # FastAPI
@@ -13,23 +12,28 @@ from auth.router import api_router as auth_router
 from notes.router import api_router as notes_router
 
 # db
-from imagine.db_manager import db, rd
+from imagine.db_manager import adb, ard
+
+# Common
+from imagine.commons import NEXT_CURSOR_HEADER
+from imagine.serializers import ORJSONResponse
 
 # Middleware
-from imagine.middleware import LogsMiddleware
+from imagine.middleware import LogsMiddleware, logs_writer
+from imagine import metrics
+from imagine.permissions import permissions
+
+# Services
+from notes.services.likes import likes_writer
+from auth.services.passwords import password_pool
 
 # Env
 from decouple import config, Csv
 
 app = FastAPI(
     title="Imagine API",
+    default_response_class=ORJSONResponse,
 )
-try:
-    file = os.path.dirname(__file__) + "/db_files/creation.sql"
-    db.create_db(file)
-except:
-    pass
-
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,28 +41,58 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
 app.add_middleware(LogsMiddleware)
 
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     print("*" * 20, flush=True)
     print("Starting up...", flush=True)
     print("connecting to db...", flush=True)
-    db.fetch_one("SELECT 1")
+    await adb.fetch_one("SELECT 1")
     print("connected to db...", flush=True)
     print("connecting to redis...", flush=True)
-    rd.conn.ping()
+    await ard.conn.ping()
+    ard.listen_invalidations()
     print("connected to redis...", flush=True)
+    print("loading permissions...", flush=True)
+    await permissions.load()
+    await permissions.listen()
+    print("permissions loaded...", flush=True)
+    logs_writer.start()
+    likes_writer.start()
+    # threads running the sync (def) handlers and dependencies
+    to_thread.current_default_thread_limiter().total_tokens = config(
+        "THREADPOOL_SIZE", cast=int, default=40
+    )
+    metrics.sampler.add("db", adb.stats)
+    metrics.sampler.add("logs_writer", logs_writer.stats)
+    metrics.sampler.add("likes_writer", likes_writer.stats)
+    metrics.sampler.add("passwords", password_pool.stats)
+    if ard.local is not None:
+        metrics.sampler.add("local_cache", lambda: {"size": len(ard.local)})
+    metrics.sampler.start()
     print("*" * 20, flush=True)
 
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     print("*" * 20, flush=True)
     print("Shutting down...", flush=True)
+    await metrics.sampler.close()
+    print("flushing logs...", flush=True)
+    await logs_writer.close()
+    print(f"logs writer stats: {logs_writer.stats()}", flush=True)
+    print("flushing likes...", flush=True)
+    await likes_writer.close()
+    print(f"likes writer stats: {likes_writer.stats()}", flush=True)
+    password_pool.shutdown()
+    print(f"password pool stats: {password_pool.stats()}", flush=True)
+    await adb.close()
+    await ard.close()
     print("*" * 20, flush=True)
 
 
@@ -1,3 +1,5 @@
+from enum import Enum
+
 from pydantic import BaseModel, Field
 from notes.schemas import tags
 
@@ -39,3 +41,12 @@ class PatchNote(BaseModel):
     content: str | None = Field(None, min_length=3, max_length=1000)
     favorite: bool | None = Field(None)
     tags: list[str] | None = Field(None, min_length=0, max_length=100)
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class ImportedNotes(BaseModel):
+    imported: int
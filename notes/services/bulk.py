@@ -0,0 +1,217 @@
+import io
+import csv
+import tempfile
+from datetime import datetime
+from typing import IO, AsyncIterator, Iterator
+
+import asyncpg
+from pydantic import ValidationError
+
+# FastAPI
+from fastapi.exceptions import HTTPException
+
+# Settings
+from decouple import config
+
+# Schemas
+from notes.schemas.notes import CreateNote, ExportFormat
+
+# DB
+from imagine import procedures, serializers
+from imagine.db_manager import adb, ard
+
+IMPORT_CHUNK_SIZE = config("NOTES_IMPORT_CHUNK_SIZE", cast=int, default=5000)
+EXPORT_CHUNK_SIZE = config("NOTES_EXPORT_CHUNK_SIZE", cast=int, default=1000)
+# longest accepted NDJSON line, in bytes
+IMPORT_MAX_LINE = config("NOTES_IMPORT_MAX_LINE", cast=int, default=1024 * 1024)
+# validated notes are kept in memory up to this many bytes, then on disk
+IMPORT_SPOOL_SIZE = config(
+    "NOTES_IMPORT_SPOOL_SIZE", cast=int, default=8 * 1024 * 1024
+)
+
+EXPORT_COLUMNS = (
+    "id",
+    "title",
+    "content",
+    "favorite",
+    "user_id",
+    "tags",
+    "likes",
+    "created_at",
+    "updated_at",
+)
+
+IMPORT_COLUMNS = ("line", "title", "content", "favorite", "tags")
+
+# dropped with the transaction of the import
+_STAGING_TABLE = """
+create temporary table notes_import (
+    line integer,
+    note_id bigint,
+    title varchar(255),
+    content text,
+    favorite boolean,
+    tags varchar[]
+) on commit drop
+"""
+
+
+def _too_long(number: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail={"line": number, "errors": f"Line longer than {IMPORT_MAX_LINE} bytes"},
+    )
+
+
+async def _lines(body: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, bytes]]:
+    """Split a streamed body in numbered lines, skipping blank ones
+
+    Raises:
+        HTTPException: 413 if a line is longer than IMPORT_MAX_LINE
+    """
+    buffer = b""
+    number = 0
+    async for chunk in body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if len(line) > IMPORT_MAX_LINE:
+                raise _too_long(number)
+            if line.strip():
+                yield number, line
+        if len(buffer) > IMPORT_MAX_LINE:
+            raise _too_long(number + 1)
+    if buffer.strip():
+        yield number + 1, buffer
+
+
+def _record(number: int, line: bytes) -> tuple:
+    """Validate one NDJSON line as a note, in IMPORT_COLUMNS order
+
+    Raises:
+        HTTPException: if the line is not a valid note
+    """
+    try:
+        note = CreateNote.model_validate_json(line)
+    except ValidationError as e:
+        errors = serializers.loads(e.json(include_url=False))
+        raise HTTPException(
+            status_code=422, detail={"line": number, "errors": errors}
+        )
+    return (number, note.title, note.content, note.favorite, note.tags)
+
+
+def _chunks(spool: IO[bytes]) -> Iterator[list[tuple]]:
+    """Read the spooled records back in IMPORT_CHUNK_SIZE lists"""
+    records = []
+    for line in spool:
+        records.append(tuple(serializers.loads(line)))
+        if len(records) >= IMPORT_CHUNK_SIZE:
+            yield records
+            records = []
+    if records:
+        yield records
+
+
+async def import_notes(body: AsyncIterator[bytes], user_id: str) -> int:
+    """Import NDJSON notes in a single transaction
+
+    The whole body is received and validated first, the valid records are
+    spooled (to disk past IMPORT_SPOOL_SIZE), so a slow upload never holds
+    a pooled connection. Then the records are copied in chunks to a staging
+    table and imfun_import_notes moves them to notes and links their tags.
+
+    Args:
+        body (AsyncIterator[bytes]): request body, one note per line
+        user_id (str): owner of the notes
+
+    Raises:
+        HTTPException: if a line is invalid or the import fails
+
+    Returns:
+        int: number of imported notes
+    """
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE) as spool:
+        count = 0
+        async for number, line in _lines(body):
+            spool.write(serializers.dumps(_record(number, line)) + b"\n")
+            count += 1
+        if not count:
+            return 0
+        spool.seek(0)
+
+        try:
+            async with adb.connection() as conn:
+                async with conn.transaction():
+                    await conn.execute(_STAGING_TABLE)
+                    for records in _chunks(spool):
+                        await conn.copy_records_to_table(
+                            "notes_import", records=records, columns=IMPORT_COLUMNS
+                        )
+                    imported = await conn.fetchval(
+                        procedures.call_statement("imfun_import_notes"), user_id
+                    )
+        except asyncpg.PostgresError as e:
+            detail = "Something went wrong with the database: "
+            raise HTTPException(status_code=500, detail=detail + str(e))
+
+    if imported:
+        await ard.invalidate("notes")
+    return imported
+
+
+def _ndjson(rows: list[dict]) -> bytes:
+    return b"".join(serializers.dumps(row) + b"\n" for row in rows)
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ",".join(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv(rows: list[tuple], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+    return buffer.getvalue()
+
+
+async def export_notes(
+    export_format: ExportFormat, user_id: str | None = None
+) -> AsyncIterator[bytes | str]:
+    """Stream the active notes from a server side cursor
+
+    Only ``EXPORT_CHUNK_SIZE`` rows are held at a time, each chunk is sent to
+    the client before the next one is fetched. CSV rows stay tuples, in the
+    column order of imfun_export_notes (EXPORT_COLUMNS).
+
+    Args:
+        export_format (ExportFormat): ndjson or csv
+        user_id (str | None): only export the notes of this user
+
+    Yields:
+        bytes | str: chunk of the export
+    """
+    if export_format == ExportFormat.csv:
+        encode, mode = _csv, "tuple"
+        yield _csv([], header=True)
+    else:
+        encode, mode = _ndjson, "dict"
+
+    rows = []
+    async for row in adb.stream_sp(
+        "imfun_export_notes", user_id, itersize=EXPORT_CHUNK_SIZE, mode=mode
+    ):
+        rows.append(row)
+        if len(rows) >= EXPORT_CHUNK_SIZE:
+            yield encode(rows)
+            rows = []
+    if rows:
+        yield encode(rows)
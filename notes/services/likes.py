@@ -0,0 +1,60 @@
+# FastAPI
+from fastapi.exceptions import HTTPException
+
+# Settings
+from decouple import config
+
+# DB
+from imagine.db_manager import adb, ard
+from imagine.batch_writer import BatchWriter
+
+
+async def _write_likes(likes: list[tuple[int, str]]) -> None:
+    """Insert a batch of likes and refresh the cache of the liked notes
+
+    Only the note keys are deleted, cached list pages pick the new counters
+    up when they expire instead of being wiped on every flush. Writing the
+    same batch twice is harmless, likes already given are skipped.
+
+    Args:
+        likes (list[tuple[int, str]]): (note_id, user_id) pairs
+    """
+    await adb.execute_sp(
+        "imfun_like_notes",
+        [note_id for note_id, _ in likes],
+        [user_id for _, user_id in likes],
+    )
+
+    for note_id in {note_id for note_id, _ in likes}:
+        await ard.delete(f"note:{note_id}")
+
+
+# A like is acknowledged when it is queued, before it is written. A full
+# queue makes the request wait, and a failed batch is retried and then
+# written one like at a time, so only a like that can't be written at all
+# (e.g. its user was deleted) is lost, plus whatever is still queued if the
+# worker dies without running its shutdown event.
+likes_writer = BatchWriter(
+    "likes_writer",
+    _write_likes,
+    max_size=config("LIKES_QUEUE_SIZE", cast=int, default=10000),
+    batch_size=config("LIKES_BATCH_SIZE", cast=int, default=500),
+    interval=config("LIKES_FLUSH_INTERVAL", cast=float, default=0.2),
+    overflow="block",
+    retries=config("LIKES_RETRIES", cast=int, default=3),
+)
+
+
+async def like_note(note_id: int, user_id: str) -> None:
+    """Queue a like, repeated likes of the same user are ignored
+
+    Args:
+        note_id (int): note id
+        user_id (str): user id
+
+    Raises:
+        HTTPException: 404 if the note does not exist or is not active
+    """
+    if not await adb.execute_sp("imfun_get_note_version", note_id):
+        raise HTTPException(status_code=404, detail="Note not found")
+    await likes_writer.put((note_id, str(user_id)))
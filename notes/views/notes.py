@@ -1,86 +1,150 @@
 from typing import Annotated
+from datetime import datetime
 
 # FastAPI
-from fastapi import APIRouter, Body, Depends, status, Request, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Body, Depends, status, Request, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.exceptions import HTTPException
-from fastapi.encoders import jsonable_encoder
+
+# Serialization
+from imagine.serializers import ORJSONResponse
 
 # Common
-from imagine.commons import general_get
+from imagine.commons import general_get, decode_cursor, next_cursor
+from imagine.cache import params_key
+from imagine.response_cache import cached, conditional, render, unchanged
 
 # auth_interface
 from auth.views.auth import get_current_user
 
 # Schemas
-from notes.schemas.notes import Note, FullNote, User, CreateNote, PatchNote
+from notes.schemas.notes import (
+    Note,
+    FullNote,
+    User,
+    CreateNote,
+    PatchNote,
+    ExportFormat,
+    ImportedNotes,
+)
 
 # DB
-from imagine.db_manager import db, get_rd, RedisManager
+from imagine.db_manager import adb, get_rd, AsyncRedisManager
+
+# Services
+from notes.services import bulk, likes
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 
 
 @router.get("/", response_model=list[Note], status_code=status.HTTP_200_OK)
-def get_notes(
-    cache: Annotated[RedisManager, Depends(get_rd)],
+async def get_notes(
+    request: Request,
+    cache: Annotated[AsyncRedisManager, Depends(get_rd)],
     pagination: Annotated[dict, Depends(general_get)],
     search_name: str | None = Query(None),
     tags: list[str] | None = Query(None),
     favorites: bool | None = Query(None),
-) -> JSONResponse:
+) -> Response:
     """Get all notes
 
     Args:
         request (Request): request
 
     Returns:
-        JSONResponse: notes
+        Response: notes, X-Next-Cursor header points to the next page
     """
-    cache_key = f"notes:{pagination['q']}:{pagination['page']}:{pagination['size']}"
-    if (cache_data := cache.get(cache_key)) is not None:
-        return JSONResponse(cache_data)
-
-    notes = db.execute_sp(
-        "imfun_get_notes",
-        f"'{pagination['q']}'::varchar" if pagination["q"] else "null::varchar",
-        f"{pagination['page']}::int",
-        f"{pagination['size']}::int",
-        f"'{search_name}'::varchar" if search_name else "null::varchar",
-        f"'{tags}'::varchar[]" if tags else "null::varchar[]",
-        f"'{favorites}'::boolean" if favorites else "null::boolean",
+    cursor_updated_at, cursor_id = decode_cursor(
+        pagination["cursor"], datetime.fromisoformat, int
+    )
+    cache_key = await cache.namespace_key(
+        "notes",
+        params_key(
+            {
+                **pagination,
+                "search_name": search_name,
+                "tags": tags,
+                "favorites": favorites,
+            },
+            case_sensitive=["tags", "cursor"],
+        ),
     )
-    cache.create(cache_key, notes, 5)
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(notes))
+    async def fetch() -> dict[bytes, bytes]:
+        notes = await adb.execute_sp(
+            "imfun_get_notes",
+            pagination["q"],
+            pagination["page"],
+            pagination["size"],
+            search_name,
+            tags,
+            favorites,
+            cursor_updated_at,
+            cursor_id,
+            pagination["search_mode"],
+        )
+        return render(notes, next_cursor(notes, pagination, "updated_at", "id"))
+
+    return await cached(cache, cache_key, request, fetch)
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_notes(
+    export_format: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+    mine: bool = Query(False),
+    user: User = Depends(get_current_user),
+) -> StreamingResponse:
+    """Export the active notes, streamed as NDJSON or CSV
+
+    Args:
+        request (Request): request
+
+    Returns:
+        StreamingResponse: one note per line
+    """
+    media_types = {
+        ExportFormat.ndjson: "application/x-ndjson",
+        ExportFormat.csv: "text/csv",
+    }
+    filename = f"notes.{export_format.value}"
+
+    return StreamingResponse(
+        bulk.export_notes(export_format, user.id if mine else None),
+        media_type=media_types[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.get("/{note_id}", response_model=FullNote, status_code=status.HTTP_200_OK)
-def get_note(
-    cache: Annotated[RedisManager, Depends(get_rd)],
+async def get_note(
+    request: Request,
+    cache: Annotated[AsyncRedisManager, Depends(get_rd)],
     note_id: int,
-) -> JSONResponse:
+) -> Response:
     """Get a note
 
     Args:
         request (Request): request
 
     Returns:
-        JSONResponse: note
+        Response: note, 304 if the ETag or Last-Modified of the client match
     """
-    cache_key = f"note:{note_id}"
-    if (cache_data := cache.get(cache_key)) is not None:
-        return JSONResponse(cache_data)
+    if conditional(request):
+        version = await adb.execute_sp("imfun_get_note_version", note_id)
+        if version and (response := unchanged(request, version)) is not None:
+            return response
 
-    note = db.execute_sp("imfun_get_note", f"{note_id}::int")
-    cache.create(cache_key, note, 5)
+    async def fetch() -> dict[bytes, bytes]:
+        current = await adb.execute_sp("imfun_get_note_version", note_id)
+        note = await adb.execute_sp("imfun_get_note", note_id)
+        return render(note, version=current)
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(note))
+    return await cached(cache, f"note:{note_id}", request, fetch)
 
 
 @router.post("/", response_model=Note, status_code=status.HTTP_201_CREATED)
-def create_note(
-    cache: Annotated[RedisManager, Depends(get_rd)],
+async def create_note(
+    cache: Annotated[AsyncRedisManager, Depends(get_rd)],
     user: User = Depends(get_current_user),
     note: CreateNote = Body(...),
 ) -> JSONResponse:
@@ -93,29 +157,48 @@ def create_note(
         JSONResponse: note
     """
 
-    favorite = "true" if note.favorite else "false"
-    
-    tags = str(note.tags).replace("[", "{").replace("]", "}").replace("'", "")
-
-    note = db.execute_sp(
+    note = await adb.execute_sp(
         "imfun_create_note",
-        f"'{note.title}'::varchar",
-        f"'{note.content}'::varchar",
-        f"'{tags}'::varchar[]",
-        f"{favorite}::boolean",
-        f"'{user.id}'::uuid",
+        note.title,
+        note.content,
+        note.tags,
+        note.favorite,
+        user.id,
     )
 
-    cache.delete(f"notes:*")
+    await cache.invalidate("notes")
 
-    return JSONResponse(
-        status_code=status.HTTP_201_CREATED, content=jsonable_encoder(note)
+    return ORJSONResponse(
+        status_code=status.HTTP_201_CREATED, content=note
+    )
+
+
+@router.post(
+    "/bulk", response_model=ImportedNotes, status_code=status.HTTP_201_CREATED
+)
+async def import_notes(
+    request: Request,
+    user: User = Depends(get_current_user),
+) -> JSONResponse:
+    """Import notes from an NDJSON body, one CreateNote per line
+
+    Args:
+        request (Request): request
+
+    Returns:
+        JSONResponse: number of imported notes
+    """
+
+    imported = await bulk.import_notes(request.stream(), user.id)
+
+    return ORJSONResponse(
+        status_code=status.HTTP_201_CREATED, content={"imported": imported}
     )
 
 
 @router.patch("/{note_id}", response_model=Note, status_code=status.HTTP_200_OK)
-def patch_note(
-    cache: Annotated[RedisManager, Depends(get_rd)],
+async def patch_note(
+    cache: Annotated[AsyncRedisManager, Depends(get_rd)],
     note_id: int,
     user: User = Depends(get_current_user),
     note: PatchNote = Body(...),
@@ -129,34 +212,30 @@ def patch_note(
         JSONResponse: note
     """
 
-    favorite = "true" if note.favorite else "false"
-
-    tags = str(note.tags).replace("[", "{").replace("]", "}").replace("'", "")
-
-
-    db.execute_sp(
+    await adb.execute_sp(
         "imfun_patch_note",
-        f"{note_id}::int",
-        f"'{note.title}'::varchar" if note.title else "null::varchar",
-        f"'{note.content}'::varchar" if note.content else "null::varchar",
-        f"'{tags}'::varchar[]" if note.tags else "null::varchar[]",
-        f"{favorite}::boolean" if note.favorite else "null::boolean",
-        f"'{user.id}'::uuid",
+        note_id,
+        note.title,
+        note.content,
+        note.tags or None,
+        note.favorite,
+        user.id,
     )
 
-    cache.delete(f"notes:*")
-    cache.delete(f"note:{note_id}")
+    await cache.invalidate("notes")
+    await cache.delete(f"note:{note_id}")
+    if note.tags:
+        await cache.invalidate("tags")
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(note))
+    return ORJSONResponse(status_code=status.HTTP_200_OK, content=note)
 
 
 @router.post("/{note_id}/like", status_code=status.HTTP_200_OK)
-def like_note(
-    cache: Annotated[RedisManager, Depends(get_rd)],
+async def like_note(
     note_id: int,
     user: User = Depends(get_current_user),
 ) -> JSONResponse:
-    """Like a note
+    """Like a note, the like is written with the next batch
 
     Args:
         request (Request): request
@@ -165,13 +244,6 @@ def like_note(
         JSONResponse: note
     """
 
-    db.execute_sp(
-        "imfun_like_note",
-        f"{note_id}::int",
-        f"'{user.id}'::uuid",
-    )
-
-    cache.delete(f"notes:*")
-    cache.delete(f"note:{note_id}")
+    await likes.like_note(note_id, user.id)
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content={})
+    return ORJSONResponse(status_code=status.HTTP_200_OK, content={})
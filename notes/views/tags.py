@@ -1,13 +1,17 @@
 from typing import Annotated
 
 # FastAPI
-from fastapi import APIRouter, Body, Depends, status, Request, Query
+from fastapi import APIRouter, Body, Depends, status, Request, Query, Response
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import HTTPException
-from fastapi.encoders import jsonable_encoder
+
+# Serialization
+from imagine.serializers import ORJSONResponse
 
 # Common
-from imagine.commons import general_get
+from imagine.commons import general_get, decode_cursor, next_cursor
+from imagine.cache import params_key
+from imagine.response_cache import cached, render
 
 # auth_interface
 from auth.views.auth import get_current_user
@@ -16,39 +20,46 @@ from auth.views.auth import get_current_user
 from notes.schemas.tags import Tag
 
 # DB
-from imagine.db_manager import db, get_rd, RedisManager
+from imagine.db_manager import adb, get_rd, AsyncRedisManager
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 
 @router.get("/", response_model=list[Tag], status_code=status.HTTP_200_OK)
-def get_tags(
-    cache: Annotated[RedisManager, Depends(get_rd)],
+async def get_tags(
+    request: Request,
+    cache: Annotated[AsyncRedisManager, Depends(get_rd)],
     pagination: Annotated[dict, Depends(general_get)],
-) -> JSONResponse:
+) -> Response:
     """Get all tags
 
     Args:
         request (Request): request
 
     Returns:
-        JSONResponse: tags
+        Response: tags, X-Next-Cursor header points to the next page
     """
-    cache_key = f"tags:{pagination['q']}:{pagination['page']}:{pagination['size']}"
-    if (cache_data := cache.get(cache_key)) is not None:
-        return JSONResponse(cache_data)
-
-    tags = db.execute_sp(
-        "imfun_get_tags",
-        f"'{pagination['q']}'::varchar" if pagination["q"] else "null::varchar",
-        f"{pagination['page']}::int",
-        f"{pagination['size']}::int",
+    cursor_name, cursor_id = decode_cursor(pagination["cursor"], str, int)
+    cache_key = await cache.namespace_key(
+        "tags", params_key(pagination, case_sensitive=["cursor"])
     )
-    cache.create(cache_key, tags, 5)
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(tags))
+    async def fetch() -> dict[bytes, bytes]:
+        tags = await adb.execute_sp(
+            "imfun_get_tags",
+            pagination["q"],
+            pagination["page"],
+            pagination["size"],
+            cursor_name,
+            cursor_id,
+            pagination["search_mode"],
+        )
+        return render(tags, next_cursor(tags, pagination, "name", "id"))
+
+    return await cached(cache, cache_key, request, fetch)
 
 @router.post("/", response_model=Tag, status_code=status.HTTP_201_CREATED)
-def create_tag(
+async def create_tag(
+    cache: Annotated[AsyncRedisManager, Depends(get_rd)],
     tag: Tag = Body(...),
 ) -> JSONResponse:
     """Create a new tag
@@ -59,9 +70,10 @@ def create_tag(
     Returns:
         JSONResponse: tag
     """
-    db.execute_sp(
+    await adb.execute_sp(
         "imfun_create_tag",
-        f"'{tag.name}'::varchar",
+        tag.name,
     )
+    await cache.invalidate("tags")
 
-    return JSONResponse(status_code=status.HTTP_201_CREATED, content={})
\ No newline at end of file
+    return ORJSONResponse(status_code=status.HTTP_201_CREATED, content={})
\ No newline at end of file
@@ -1,13 +1,19 @@
 from typing import Annotated
+from datetime import datetime
+from uuid import UUID
 
 # FastAPI
-from fastapi import APIRouter, Body, Depends, status, Request
+from fastapi import APIRouter, Body, Depends, status, Request, Response
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import HTTPException
-from fastapi.encoders import jsonable_encoder
+
+# Serialization
+from imagine.serializers import ORJSONResponse
 
 # Common
-from imagine.commons import general_get
+from imagine.commons import general_get, decode_cursor, next_cursor
+from imagine.cache import params_key
+from imagine.response_cache import cached, conditional, render, unchanged
 
 # auth_interface
 from auth.views.auth import get_current_user
@@ -16,65 +22,77 @@ from auth.views.auth import get_current_user
 from users.schemas.users import BaseUser, User, UserPatch
 
 # DB
-from imagine.db_manager import db, get_rd, RedisManager
+from imagine.db_manager import adb, get_rd, AsyncRedisManager
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=list[BaseUser])
-def get_all_users(
-    cache: Annotated[RedisManager, Depends(get_rd)],
+async def get_all_users(
+    request: Request,
+    cache: Annotated[AsyncRedisManager, Depends(get_rd)],
     pagination: Annotated[dict, Depends(general_get)],
-) -> JSONResponse:
+) -> Response:
     """Get all users
 
     Args:
         request (Request): request
 
     Returns:
-        JSONResponse: users
+        Response: users, X-Next-Cursor header points to the next page
     """
-    cache_key = f"users:{pagination['q']}:{pagination['page']}:{pagination['size']}"
-    if (cache_data := cache.get(cache_key)) is not None:
-        return JSONResponse(cache_data)
-
-    users = db.execute_sp(
-        "imfun_get_users",
-        f"'{pagination['q']}'::varchar" if pagination["q"] else "null",
-        f"{pagination['page']}::int",
-        f"{pagination['size']}::int",
+    cursor_updated_at, cursor_id = decode_cursor(
+        pagination["cursor"], datetime.fromisoformat, lambda value: str(UUID(value))
     )
-    cache.create(cache_key, users, 5)
+    cache_key = await cache.namespace_key(
+        "users", params_key(pagination, case_sensitive=["cursor"])
+    )
+
+    async def fetch() -> dict[bytes, bytes]:
+        users = await adb.execute_sp(
+            "imfun_get_users",
+            pagination["q"],
+            pagination["page"],
+            pagination["size"],
+            cursor_updated_at,
+            cursor_id,
+            pagination["search_mode"],
+        )
+        return render(users, next_cursor(users, pagination, "updated_at", "id"))
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(users))
+    return await cached(cache, cache_key, request, fetch)
 
 
 @router.get("/{user_id}", status_code=status.HTTP_200_OK, response_model=User)
-def get_user(
-    cache: Annotated[RedisManager, Depends(get_rd)],
+async def get_user(
+    request: Request,
+    cache: Annotated[AsyncRedisManager, Depends(get_rd)],
     user_id: str,
-) -> JSONResponse:
+) -> Response:
     """Get user
 
     Args:
         request (Request): request
 
     Returns:
-        JSONResponse: user
+        Response: user, 304 if the ETag or Last-Modified of the client match
     """
-    cache_key = f"user:{user_id}"
-    if (cache_data := cache.get(cache_key)) is not None:
-        return JSONResponse(cache_data)
+    if conditional(request):
+        version = await adb.execute_sp("imfun_get_user_version", user_id)
+        if version and (response := unchanged(request, version)) is not None:
+            return response
 
-    user = db.execute_sp("imfun_get_user", f"'{user_id}'::uuid")
-    cache.create(cache_key, user, 5)
+    async def fetch() -> dict[bytes, bytes]:
+        current = await adb.execute_sp("imfun_get_user_version", user_id)
+        user = await adb.execute_sp("imfun_get_user", user_id)
+        return render(user, version=current)
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(user))
+    return await cached(cache, f"user:{user_id}", request, fetch)
 
 
 @router.patch("/{user_id}", status_code=status.HTTP_200_OK, response_model=User)
-def update_user(
-    cache: Annotated[RedisManager, Depends(get_rd)],
+async def update_user(
+    cache: Annotated[AsyncRedisManager, Depends(get_rd)],
     user_id: str,
     user: UserPatch,
 ) -> JSONResponse:
@@ -86,15 +104,15 @@ def update_user(
     Returns:
         JSONResponse: user
     """
-    cache.delete(f"users:*")
-    cache.delete(f"user:{user_id}")
-
-    user = db.execute_sp(
+    user = await adb.execute_sp(
         "imfun_update_user",
-        f"'{user_id}'::uuid",
-        f"'{user.name}'::varchar" if user.name else "null::varchar",
-        f"'{user.email}'::varchar" if user.email else "null::varchar",
-        f"'{user.group_id}'::int" if user.group_id else "null::int",
+        user_id,
+        user.name,
+        user.email,
+        user.group_id,
     )
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(user))
+    await cache.invalidate("users")
+    await cache.delete(f"user:{user_id}")
+
+    return ORJSONResponse(status_code=status.HTTP_200_OK, content=user)